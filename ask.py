@@ -1,7 +1,15 @@
 # ask.py — LLM-powered /ask with spicy/funny persona (OpenAI)
-import os, time, discord, aiohttp
+import os, re, json, time, zlib, heapq, asyncio, hashlib, contextvars, discord, aiohttp
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable
 from discord import app_commands
 from discord.ext import commands
+from state_store import atomic_write_json  # onbot's dir is on sys.path even when ASK_EXT is a subfolder
+
+try:
+    import numpy as np  # optional: only the local knowledge index needs it
+except ImportError:
+    np = None
 
 try:
     from dotenv import load_dotenv
@@ -10,6 +18,7 @@ except Exception:
     pass
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY") or os.environ.get("OPENAI_API_TOKEN")
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
 
 PRIMARY_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
 FALLBACK_MODELS = [
@@ -20,16 +29,195 @@ FALLBACK_MODELS = [
 
 ASK_MAX_CHARS   = int(os.environ.get("ASK_MAX_CHARS", "400"))
 ASK_MAX_TOKENS  = int(os.environ.get("ASK_MAX_TOKENS", "300"))
-ASK_COOLDOWN_S  = int(os.environ.get("ASK_COOLDOWN_S", "30"))
+ASK_COOLDOWN_S  = int(os.environ.get("ASK_COOLDOWN_S", "30"))                  # per user
+ASK_CHANNEL_COOLDOWN_S = int(os.environ.get("ASK_CHANNEL_COOLDOWN_S", "0"))    # per channel (0 = off)
+ASK_GUILD_COOLDOWN_S   = int(os.environ.get("ASK_GUILD_COOLDOWN_S", "0"))      # per guild (0 = off)
 ASK_CHANNEL_ID  = os.environ.get("ASK_CHANNEL_ID")  # optional channel lock
 
+# --- HTTP pool (one keep-alive session per cog) ---
+ASK_HTTP_POOL          = int(os.environ.get("ASK_HTTP_POOL", "20"))            # max open connections
+ASK_CONNECT_TIMEOUT_S  = float(os.environ.get("ASK_CONNECT_TIMEOUT_S", "10"))
+ASK_READ_TIMEOUT_S     = float(os.environ.get("ASK_READ_TIMEOUT_S", "60"))     # per socket read
+
+# --- Streaming: show the answer as it is generated, editing one message ---
+ASK_STREAM      = os.environ.get("ASK_STREAM", "1").lower() not in ("0", "false", "no", "off")
+ASK_STREAM_EDIT_S = float(os.environ.get("ASK_STREAM_EDIT_S", "1.0"))  # min seconds between edits
+
+# --- Model health: skip models with an open breaker, optionally hedge slow ones ---
+ASK_BREAKER_FAILS      = int(os.environ.get("ASK_BREAKER_FAILS", "3"))         # consecutive failures to open
+ASK_BREAKER_ERROR_RATE = float(os.environ.get("ASK_BREAKER_ERROR_RATE", "0.5"))  # ...or error rate over window
+ASK_BREAKER_COOLDOWN_S = float(os.environ.get("ASK_BREAKER_COOLDOWN_S", "60"))  # open -> half-open probe
+ASK_HEDGE_MS           = int(os.environ.get("ASK_HEDGE_MS", "0"))  # 0 = off; start next model after this long
+
+# --- Upstream quota: bounded concurrency + requests/tokens per minute, FIFO queue ---
+ASK_MAX_CONCURRENT = int(os.environ.get("ASK_MAX_CONCURRENT", "4"))
+ASK_RPM            = int(os.environ.get("ASK_RPM", "60"))
+ASK_TPM            = int(os.environ.get("ASK_TPM", "60000"))
+ASK_QUEUE_MAX      = int(os.environ.get("ASK_QUEUE_MAX", "50"))
+ASK_MAX_RETRY_WAIT_S = float(os.environ.get("ASK_MAX_RETRY_WAIT_S", "20"))  # longest 429 wait we retry
+
+# --- Answer cache (LRU + TTL, identical in-flight questions share one request) ---
+ASK_CACHE_SIZE  = int(os.environ.get("ASK_CACHE_SIZE", "512"))       # 0 disables the cache
+ASK_CACHE_TTL_S = int(os.environ.get("ASK_CACHE_TTL_S", "21600"))    # 6h
+ASK_CACHE_FILE  = os.environ.get("ASK_CACHE_FILE")                   # optional: persist across restarts
+ASK_CACHE_BYPASS_CHANNELS = {c.strip() for c in os.environ.get("ASK_CACHE_BYPASS_CHANNELS", "").split(",") if c.strip()}
+
+# --- Local knowledge index (squad FAQ/notes, searched offline before calling the LLM) ---
+ASK_KB_FILE     = os.environ.get("ASK_KB_FILE")                        # .json/.jsonl Q&A or .md/.txt notes
+ASK_KB_TOP_K    = int(os.environ.get("ASK_KB_TOP_K", "3"))
+ASK_KB_ANSWER   = float(os.environ.get("ASK_KB_ANSWER", "0.95"))       # question-only cosine: reply from the notes, no LLM
+ASK_KB_MIN      = float(os.environ.get("ASK_KB_MIN", "0.2"))          # cosine: inject as prompt context
+ASK_KB_DIM      = int(os.environ.get("ASK_KB_DIM", "4096"))            # hashed feature buckets
+ASK_KB_SNIPPET_CHARS = int(os.environ.get("ASK_KB_SNIPPET_CHARS", "600"))
+
+# --- Conversation memory + token budget ---
+ASK_MEMORY_TURNS       = int(os.environ.get("ASK_MEMORY_TURNS", "0"))            # Q&A turns kept per channel (0 = off)
+ASK_MEMORY_TTL_S       = int(os.environ.get("ASK_MEMORY_TTL_S", "1800"))         # older turns are not context any more
+ASK_MEMORY_MAX_TOKENS  = int(os.environ.get("ASK_MEMORY_MAX_TOKENS", "200000"))  # all channels; LRU-evicted past this
+ASK_MEMORY_ANSWER_TOKENS = int(os.environ.get("ASK_MEMORY_ANSWER_TOKENS", "200"))  # stored answer is cut to this
+ASK_CONTEXT_TOKENS     = int(os.environ.get("ASK_CONTEXT_TOKENS", "1500"))       # system + history + question
+ASK_QUESTION_TOKENS    = int(os.environ.get("ASK_QUESTION_TOKENS", str(max(16, ASK_MAX_CHARS // 4))))
+ASK_PRICE_IN_PER_M     = float(os.environ.get("ASK_PRICE_IN_PER_M", "0.15"))     # USD per 1M prompt tokens
+ASK_PRICE_OUT_PER_M    = float(os.environ.get("ASK_PRICE_OUT_PER_M", "0.60"))    # USD per 1M completion tokens
+ASK_SHOW_COST          = os.environ.get("ASK_SHOW_COST", "0").lower() in ("1", "true", "yes", "on")
+
 # --- Personality knobs ---
 # 0 = chill; 1 = playful; 2 = spicy banter; 3 = max spicy (still SFW-ish)
 SPICE_LEVEL     = max(0, min(3, int(os.environ.get("SPICE_LEVEL", "2"))))
 # You can override the persona copy with ASK_PERSONA if you want.
 ASK_PERSONA     = os.environ.get("ASK_PERSONA", "").strip()
 
-_last_ask_time: dict[int, float] = {}
+class _Cooldowns:
+    """Expiring cooldown table. Each key lives only until its cooldown ends: expiries sit in a
+    min-heap and are pruned on every access, so memory tracks recent askers, not all askers."""
+
+    def __init__(self):
+        self._until: dict[tuple[str, int], float] = {}
+        self._heap: list[tuple[float, tuple[str, int]]] = []
+
+    def __len__(self) -> int:
+        return len(self._until)
+
+    def _prune(self, now: float) -> None:
+        heap, until = self._heap, self._until
+        while heap and heap[0][0] <= now:
+            exp, key = heapq.heappop(heap)
+            if until.get(key) == exp:
+                del until[key]
+
+    def remaining(self, keys: list[tuple[str, int]], now: float | None = None) -> float:
+        """Longest remaining cooldown across `keys` (0 if none are cooling down)."""
+        now = time.time() if now is None else now
+        self._prune(now)
+        return max((self._until.get(k, now) - now for k in keys), default=0.0)
+
+    def hit(self, key: tuple[str, int], duration: float, now: float | None = None) -> None:
+        if duration <= 0:
+            return
+        now = time.time() if now is None else now
+        exp = now + duration
+        self._until[key] = exp
+        heapq.heappush(self._heap, (exp, key))
+
+_cooldowns = _Cooldowns()
+
+def _cooldown_scopes(interaction: discord.Interaction) -> list[tuple[tuple[str, int], int]]:
+    scopes = [(("user", interaction.user.id), ASK_COOLDOWN_S)]
+    if ASK_CHANNEL_COOLDOWN_S > 0 and interaction.channel_id:
+        scopes.append((("channel", interaction.channel_id), ASK_CHANNEL_COOLDOWN_S))
+    if ASK_GUILD_COOLDOWN_S > 0 and interaction.guild_id:
+        scopes.append((("guild", interaction.guild_id), ASK_GUILD_COOLDOWN_S))
+    return scopes
+
+DISCORD_MSG_LIMIT = 2000
+OnDelta = Callable[[str], Awaitable[None]]  # called with the text generated so far
+
+# ---- token counting (offline): a word costs one token per ~6 chars, punctuation one each;
+# close enough to the real tokenizer for budgeting, and usage from the API is used for reporting
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_MSG_OVERHEAD = 4  # role/separator tokens per chat message
+
+def _count_tokens(text: str) -> int:
+    return sum(1 + (len(t) - 1) // 6 for t in _TOKEN_RE.findall(text))
+
+def _trim_to_tokens(text: str, limit: int) -> str:
+    used = 0
+    for m in _TOKEN_RE.finditer(text):
+        used += 1 + (len(m.group()) - 1) // 6
+        if used > limit:
+            return text[:m.start()].rstrip() + " …"
+    return text
+
+class _Turn:
+    __slots__ = ("ts", "q", "a", "tokens")
+
+    def __init__(self, ts: float, q: str, a: str):
+        self.ts, self.q, self.a = ts, q, a
+        self.tokens = _count_tokens(q) + _count_tokens(a) + 2 * _MSG_OVERHEAD
+
+class _ConversationMemory:
+    """Recent Q&A turns per channel: a ring buffer of `turns` each. Channels are kept in LRU
+    order and the least recently used are dropped once all buffers together pass `max_tokens`."""
+
+    def __init__(self, turns: int, max_tokens: int, ttl_s: float):
+        self.turns, self.max_tokens, self.ttl_s = turns, max_tokens, ttl_s
+        self._channels: OrderedDict[int, deque[_Turn]] = OrderedDict()
+        self.tokens = 0
+        self.stats = {"evicted": 0}
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def history(self, channel_id: int, now: float) -> list[_Turn]:
+        buf = self._channels.get(channel_id)
+        if buf is None:
+            return []
+        while buf and now - buf[0].ts > self.ttl_s:
+            self.tokens -= buf.popleft().tokens
+        if not buf:
+            del self._channels[channel_id]
+            return []
+        self._channels.move_to_end(channel_id)
+        return list(buf)
+
+    def add(self, channel_id: int, q: str, a: str, now: float) -> None:
+        if self.turns <= 0:
+            return
+        buf = self._channels.get(channel_id)
+        if buf is None:
+            buf = self._channels[channel_id] = deque(maxlen=self.turns)
+        else:
+            self._channels.move_to_end(channel_id)
+        if len(buf) == buf.maxlen:
+            self.tokens -= buf[0].tokens  # about to fall off the ring
+        turn = _Turn(now, q, _trim_to_tokens(a, ASK_MEMORY_ANSWER_TOKENS))
+        buf.append(turn)
+        self.tokens += turn.tokens
+        while self.tokens > self.max_tokens and len(self._channels) > 1:
+            _, old = self._channels.popitem(last=False)
+            self.tokens -= sum(t.tokens for t in old)
+            self.stats["evicted"] += 1
+
+    def forget(self, channel_id: int) -> int:
+        buf = self._channels.pop(channel_id, None)
+        if not buf:
+            return 0
+        self.tokens -= sum(t.tokens for t in buf)
+        return len(buf)
+
+def _fit_history(turns: list[_Turn], budget: int) -> tuple[_Turn, ...]:
+    """The newest turns that fit in `budget` tokens, oldest first."""
+    out, used = [], 0
+    for t in reversed(turns):
+        if used + t.tokens > budget:
+            break
+        out.append(t)
+        used += t.tokens
+    return tuple(reversed(out))
+
+def _prompt_tokens(prompt: str, sysmsg: str, history: tuple[_Turn, ...] = ()) -> int:
+    return (_count_tokens(sysmsg) + _count_tokens(_trim_to_tokens(prompt, ASK_QUESTION_TOKENS))
+            + sum(t.tokens for t in history) + 2 * _MSG_OVERHEAD)
 
 def _persona_text(spice: int, nsfw_ok: bool) -> str:
     """Build the system prompt based on spice level and channel NSFW."""
@@ -65,73 +253,728 @@ def _persona_text(spice: int, nsfw_ok: bool) -> str:
 
     return f"{base}\nTone: {seasoning}\n{rails}{signoff}"
 
-async def _try_openai(model: str, prompt: str, sysmsg: str) -> tuple[bool, str]:
+class _ModelHealth:
+    """Rolling outcome/latency window plus a closed → open → half-open circuit breaker."""
+
+    WINDOW = 50
+    MIN_SAMPLES = 10
+
+    def __init__(self):
+        self.samples: deque[tuple[bool, float]] = deque(maxlen=self.WINDOW)
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.requests = 0
+        self.errors = 0
+
+    def available(self) -> bool:
+        """Closed, or due for its single half-open trial request."""
+        if self.state == "open" and time.monotonic() >= self.open_until:
+            self.state = "half_open"
+        return self.state == "closed" or (self.state == "half_open" and not self.probing)
+
+    def begin(self) -> None:
+        if self.state == "half_open":
+            self.probing = True
+
+    def record(self, ok: bool, latency_s: float) -> None:
+        self.requests += 1
+        self.samples.append((ok, latency_s))
+        self.probing = False
+        if ok:
+            self.consecutive_failures = 0
+            self.state = "closed"
+            return
+        self.errors += 1
+        self.consecutive_failures += 1
+        if (self.state == "half_open"
+                or self.consecutive_failures >= ASK_BREAKER_FAILS
+                or (len(self.samples) >= self.MIN_SAMPLES and self.error_rate() > ASK_BREAKER_ERROR_RATE)):
+            self.state = "open"
+            self.open_until = time.monotonic() + ASK_BREAKER_COOLDOWN_S
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for ok, _ in self.samples if not ok) / len(self.samples)
+
+    def latency_pct(self, q: float) -> float | None:
+        lat = sorted(l for ok, l in self.samples if ok)
+        if not lat:
+            return None
+        return lat[min(len(lat) - 1, int(len(lat) * q))]
+
+_health: dict[str, _ModelHealth] = {}
+
+def _model_health(model: str) -> _ModelHealth:
+    h = _health.get(model)
+    if h is None:
+        h = _health[model] = _ModelHealth()
+    return h
+
+def _route_models() -> list[str]:
+    """Configured order, minus models whose breaker is open (never returns an empty list)."""
+    tried = [PRIMARY_MODEL] + [m for m in FALLBACK_MODELS if m != PRIMARY_MODEL]
+    usable = [m for m in tried if _model_health(m).available()]
+    return usable or tried[:1]
+
+class _TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(1, per_minute))
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, n: float) -> float:
+        self._refill()
+        n = min(n, self.capacity)
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+    def take(self, n: float) -> None:
+        self._refill()
+        self.tokens -= n
+
+    def refund(self, n: float) -> None:
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + n)
+
+class _QueueFull(Exception):
+    pass
+
+class _QuotaManager:
+    """FIFO admission for upstream calls: at most `max_concurrent` in flight, within RPM/TPM
+    buckets, and paused globally after a 429 until its Retry-After has passed."""
+
+    def __init__(self, max_concurrent: int, rpm: int, tpm: int, queue_max: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self.queue_max = queue_max
+        self.rpm = _TokenBucket(rpm)
+        self.tpm = _TokenBucket(tpm)
+        self.active = 0
+        self.blocked_until = 0.0
+        self._waiters: deque[object] = deque()
+        self._changed = asyncio.Event()
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "rate_limited": 0}
+
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _admit_delay(self, est: int) -> float | None:
+        """0 = go now, seconds = wait for a bucket/429 pause, None = wait for a free slot."""
+        if self.active >= self.max_concurrent:
+            return None
+        return max(self.blocked_until - time.monotonic(), self.rpm.wait_time(1), self.tpm.wait_time(est), 0.0)
+
+    async def acquire(self, est: int, on_position: Callable[[int], Awaitable[None]] | None = None) -> None:
+        if len(self._waiters) >= self.queue_max:
+            self.stats["rejected"] += 1
+            raise _QueueFull()
+        ticket = object()
+        self._waiters.append(ticket)
+        reported = 0
+        try:
+            while True:
+                pos = self._waiters.index(ticket)
+                delay = self._admit_delay(est) if pos == 0 else None
+                if delay == 0:
+                    self._waiters.popleft()
+                    self.rpm.take(1)
+                    self.tpm.take(est)
+                    self.active += 1
+                    self.stats["admitted"] += 1
+                    self._notify()
+                    return
+                if not reported:
+                    self.stats["queued"] += 1
+                # grab the event before any await: a release during the feedback edit below
+                # must still wake this waiter
+                changed = self._changed
+                if on_position is not None and pos + 1 != reported:
+                    try:
+                        await on_position(pos + 1)
+                    except Exception:
+                        pass
+                reported = pos + 1
+                try:
+                    await asyncio.wait_for(changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            if ticket in self._waiters:
+                self._waiters.remove(ticket)
+                self._notify()
+            raise
+
+    def release(self, est: int, actual: int | None = None) -> None:
+        self.active -= 1
+        if actual is not None:
+            if actual < est:
+                self.tpm.refund(est - actual)
+            else:
+                self.tpm.take(actual - est)
+        self._notify()
+
+    def rate_limited(self, retry_after: float) -> None:
+        self.stats["rate_limited"] += 1
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+_quota = _QuotaManager(ASK_MAX_CONCURRENT, ASK_RPM, ASK_TPM, ASK_QUEUE_MAX)
+
+# set by the /ask command so queued requests can tell the user where they stand
+_queue_feedback: contextvars.ContextVar[Callable[[int], Awaitable[None]] | None] = \
+    contextvars.ContextVar("ask_queue_feedback", default=None)
+# set by the /ask handler; the winning attempt fills in {"model": ..., "usage": {...}}
+_usage_report: contextvars.ContextVar[dict | None] = contextvars.ContextVar("ask_usage_report", default=None)
+
+def _estimate_tokens(prompt: str, sysmsg: str, history: tuple[_Turn, ...] = ()) -> int:
+    # prompt as sent, plus the completion budget
+    return _prompt_tokens(prompt, sysmsg, history) + ASK_MAX_TOKENS
+
+def _make_session() -> aiohttp.ClientSession:
+    """Long-lived session: keep-alive pool + DNS cache, split connect/read timeouts."""
+    connector = aiohttp.TCPConnector(
+        limit=ASK_HTTP_POOL,
+        ttl_dns_cache=300,
+        keepalive_timeout=60,
+        enable_cleanup_closed=True,
+    )
+    timeout = aiohttp.ClientTimeout(total=None, connect=ASK_CONNECT_TIMEOUT_S, sock_read=ASK_READ_TIMEOUT_S)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+async def _read_sse(r: aiohttp.ClientResponse, on_delta: OnDelta, meta: dict | None = None) -> str:
+    """Consume an OpenAI `stream: true` body, reporting accumulated text per chunk."""
+    parts: list[str] = []
+    async for raw in r.content:
+        line = raw.decode("utf-8", "replace").strip()
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        try:
+            js = json.loads(data)
+            if meta is not None and js.get("usage"):
+                meta["usage"] = js["usage"]
+            if not js.get("choices"):
+                continue  # final usage-only chunk
+            delta = js["choices"][0].get("delta", {}).get("content")
+        except (ValueError, KeyError, IndexError, AttributeError):
+            continue
+        if delta:
+            parts.append(delta)
+            await on_delta("".join(parts))
+    return "".join(parts)
+
+async def _try_openai(sess: aiohttp.ClientSession, model: str, prompt: str, sysmsg: str,
+                      on_delta: OnDelta | None = None, meta: dict | None = None,
+                      history: tuple[_Turn, ...] = ()) -> tuple[bool, str]:
+    """One upstream call. `meta`, if given, receives "usage" and "retry_after" (on 429).
+    `history` turns go between the system prompt and the question."""
     if not OPENAI_API_KEY:
         return False, "LLM not configured. Set OPENAI_API_KEY in your env."
-    url = "https://api.openai.com/v1/chat/completions"
+    url = f"{OPENAI_BASE_URL}/chat/completions"
     headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
     payload = {
         "model": model,
         "max_tokens": ASK_MAX_TOKENS,
         "temperature": 0.6,
-        "messages": [
-            {"role": "system", "content": sysmsg},
-            {"role": "user", "content": prompt[:ASK_MAX_CHARS]},
-        ],
+        "messages": [{"role": "system", "content": sysmsg}],
     }
-    async with aiohttp.ClientSession() as sess:
-        async with sess.post(url, json=payload, headers=headers, timeout=60) as r:
-            js = await r.json()
-            if r.status == 200 and "choices" in js:
+    for t in history:
+        payload["messages"] += [{"role": "user", "content": t.q}, {"role": "assistant", "content": t.a}]
+    payload["messages"].append({"role": "user", "content": _trim_to_tokens(prompt, ASK_QUESTION_TOKENS)})
+    if on_delta is not None:
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+    meta = meta if meta is not None else {}
+    try:
+        async with sess.post(url, json=payload, headers=headers) as r:
+            if r.status == 200 and on_delta is not None:
+                out = (await _read_sse(r, on_delta, meta)).strip()
+                return (True, out) if out else (False, "empty streamed response")
+            if r.status == 429:
                 try:
-                    return True, js["choices"][0]["message"]["content"].strip()
-                except Exception:
-                    return False, f"Unexpected OpenAI response: {str(js)[:300]}"
-            err = js.get("error", {}) if isinstance(js, dict) else {}
-            msg = err.get("message") or str(js)[:300]
-            return False, msg
-
-async def _openai_complete(prompt: str, sysmsg: str) -> str:
-    tried = [PRIMARY_MODEL] + [m for m in FALLBACK_MODELS if m != PRIMARY_MODEL]
-    last_err = None
-    for m in tried:
-        ok, out = await _try_openai(m, prompt, sysmsg)
+                    meta["retry_after"] = float(r.headers.get("Retry-After", "1"))
+                except ValueError:
+                    meta["retry_after"] = 1.0
+            js = await r.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return False, f"request failed: {e.__class__.__name__}"
+    except ValueError:  # non-JSON body, e.g. an HTML 502 page from a proxy
+        return False, f"HTTP {r.status} with a non-JSON body"
+    if isinstance(js, dict) and js.get("usage"):
+        meta["usage"] = js["usage"]
+    if r.status == 200 and isinstance(js, dict) and "choices" in js:
+        try:
+            return True, js["choices"][0]["message"]["content"].strip()
+        except Exception:
+            return False, f"Unexpected OpenAI response: {str(js)[:300]}"
+    err = js.get("error", {}) if isinstance(js, dict) else {}
+    msg = err.get("message") or (str(js)[:300] if js else f"HTTP {r.status} with an empty body")
+    return False, msg
+
+async def _attempt(sess: aiohttp.ClientSession, model: str, prompt: str, sysmsg: str,
+                   on_delta: OnDelta | None, history: tuple[_Turn, ...] = ()) -> tuple[bool, str]:
+    """_try_openai behind the quota manager, plus health bookkeeping (cancelled hedges and
+    429s are not counted). A 429 pauses all admissions for Retry-After and is retried once.
+    Raises _QueueFull when the local queue is full."""
+    health = _model_health(model)
+    est = _estimate_tokens(prompt, sysmsg, history)
+    for _ in range(2):
+        await _quota.acquire(est, _queue_feedback.get())
+        meta: dict = {}
+        health.begin()
+        t0 = time.monotonic()
+        try:
+            ok, out = await _try_openai(sess, model, prompt, sysmsg, on_delta, meta, history)
+        except asyncio.CancelledError:
+            health.probing = False
+            raise
+        finally:
+            _quota.release(est, (meta.get("usage") or {}).get("total_tokens"))
+        ra = meta.get("retry_after")
+        if ra is None or ok:
+            health.record(ok, time.monotonic() - t0)
+            break
+        health.probing = False  # a 429 says nothing about the model itself
+        _quota.rate_limited(ra)
+        if ra > ASK_MAX_RETRY_WAIT_S:
+            break
+    report = _usage_report.get()
+    if ok and report is not None:
+        report.update(model=model, usage=meta.get("usage") or {})
+    return ok, out
+
+def _should_fallback(err: str) -> bool:
+    # Only model-specific errors are worth retrying on another model (auth/quota errors aren't).
+    return not err or "model" in err.lower() or "invalid" in err.lower()
+
+async def _run_models(sess: aiohttp.ClientSession, models: list[str], prompt: str, sysmsg: str,
+                      on_delta: OnDelta | None, history: tuple[_Turn, ...] = ()) -> tuple[str, bool, str]:
+    """Walk `models` in order, falling back on model errors. With ASK_HEDGE_MS, the next model is
+    also started if the current one has neither answered nor streamed within the budget; the first
+    success (or first model to stream) wins and the other is cancelled. Returns (model, ok, out)."""
+    winner: str | None = None
+    tasks: dict[asyncio.Task, str] = {}
+    queue = list(models)
+
+    def relay(model: str) -> OnDelta | None:
+        if on_delta is None:
+            return None
+        async def cb(text: str):
+            nonlocal winner
+            if winner is None:
+                winner = model
+                for t, m in tasks.items():
+                    if m != model:
+                        t.cancel()
+            if winner == model:
+                await on_delta(text)
+        return cb
+
+    def start_next() -> None:
+        model = queue.pop(0)
+        tasks[asyncio.create_task(_attempt(sess, model, prompt, sysmsg, relay(model), history))] = model
+
+    start_next()
+    pending = set(tasks)
+    last: tuple[str, bool, str] | None = None
+    busy = False
+    try:
+        while pending:
+            hedge = ASK_HEDGE_MS > 0 and queue and winner is None and len(pending) == 1
+            done, pending = await asyncio.wait(
+                pending, timeout=ASK_HEDGE_MS / 1000 if hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                start_next()  # hedge: primary is slow, race the next model
+                pending = {t for t in tasks if not t.done()}
+                continue
+            for t in done:
+                if t.cancelled():
+                    continue
+                try:
+                    ok, out = t.result()
+                except _QueueFull:
+                    busy = True
+                    queue.clear()  # the quota is shared: another model would not get in either
+                    continue
+                m = tasks[t]
+                last = (m, ok, out)
+                if ok or winner == m:  # success, or failed mid-stream (user already sees it)
+                    return last
+                if not _should_fallback(out):
+                    queue.clear()
+            if not pending and queue:
+                start_next()
+                pending = {t for t in tasks if not t.done()}
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+    if last is None and busy:
+        raise _QueueFull()
+    return last or (models[0], False, "no response")
+
+async def _openai_complete(sess: aiohttp.ClientSession, prompt: str, sysmsg: str,
+                           on_delta: OnDelta | None = None,
+                           history: tuple[_Turn, ...] = ()) -> tuple[bool, str]:
+    """Try healthy models in configured order; returns (ok, answer or user-facing error)."""
+    try:
+        bad_model, ok, out = await _run_models(sess, _route_models(), prompt, sysmsg, on_delta, history)
+    except _QueueFull:
+        return False, "Too many questions in flight right now — try again in a minute."
+    if ok:
+        return True, out
+    return False, (
+        f"OpenAI error with model **{bad_model}**: {out}\n"
+        "Tip: set `OPENAI_MODEL` to a model your account has access to "
+        "(e.g., `gpt-4o-2024-11-20` or `gpt-4o-mini-2024-07-18`)."
+    )
+
+def _normalize_question(q: str) -> str:
+    q = re.sub(r"\s+", " ", q[:ASK_MAX_CHARS].lower()).strip()
+    return q.rstrip("?!. ")
+
+def _cache_key(q: str, sysmsg: str) -> str:
+    # sysmsg already encodes the effective spice/persona for the channel
+    persona = hashlib.sha1(sysmsg.encode()).hexdigest()[:12]
+    return f"{PRIMARY_MODEL}|{persona}|{_normalize_question(q)}"
+
+class _ResponseCache:
+    """LRU + TTL answer cache with single-flight: concurrent misses on one key share a request."""
+
+    def __init__(self, size: int, ttl_s: int, path: str | None = None):
+        self.size, self.ttl_s, self.path = size, ttl_s, path
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()  # key -> (expires_at, answer)
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and self.ttl_s > 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> str | None:
+        item = self._data.get(key)
+        if item is None or item[0] < time.time():
+            if item is not None:
+                del self._data[key]
+            self.stats["misses"] += 1
+            return None
+        self._data.move_to_end(key)
+        self.stats["hits"] += 1
+        return item[1]
+
+    def put(self, key: str, answer: str) -> None:
+        self._data[key] = (time.time() + self.ttl_s, answer)
+        self._data.move_to_end(key)
+        while len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+    async def single_flight(self, key: str, compute: Callable[[], Awaitable[tuple[bool, str]]]) -> tuple[bool, str]:
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(fut)
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            ok, answer = await compute()
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved even if nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        fut.set_result((ok, answer))
         if ok:
+            self.put(key, answer)
+        return ok, answer
+
+    def load(self) -> None:
+        if not self.path:
+            return
+        now = time.time()
+        loaded: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        try:
+            with open(self.path, "r") as f:
+                rows = json.load(f)
+            for key, exp, answer in rows[-self.size:]:
+                if exp > now and isinstance(key, str) and isinstance(answer, str):
+                    loaded[key] = (float(exp), answer)
+        except Exception as e:  # missing, corrupt or wrong-shaped file: start cold
+            if not isinstance(e, FileNotFoundError):
+                print(f"[ask] ignoring unreadable cache file {self.path}: {e}", flush=True)
+            return
+        self._data.update(loaded)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        atomic_write_json(self.path, [[k, exp, a] for k, (exp, a) in self._data.items()])
+
+class _KBHit:
+    __slots__ = ("score", "qscore", "question", "answer", "text")
+
+    def __init__(self, score: float, qscore: float, question: str, answer: str, text: str):
+        self.score, self.qscore = score, qscore  # best of both / stored question alone
+        self.question, self.answer, self.text = question, answer, text
+
+class _KBData:
+    """One built index; never mutated, so a reload swaps it in with a single assignment."""
+    __slots__ = ("entries", "idf", "matrix", "qmatrix")
+
+    def __init__(self, entries: list[tuple[str, str, str]], idf, matrix, qmatrix):
+        self.entries = entries  # (question, answer, text)
+        self.idf = idf
+        self.matrix = matrix    # (n, dim) float32, rows L2-normalised: full text
+        self.qmatrix = qmatrix  # same, question only (zero rows for plain notes)
+
+class _KnowledgeIndex:
+    """Offline TF-IDF over hashed unigrams+bigrams, searched by cosine (one mat-vec).
+
+    Corpus (ASK_KB_FILE): .json list / .jsonl of {"q": ..., "a": ...} or {"text": ...},
+    or plain text/markdown where blank lines separate notes. Q&A entries score the better
+    of question-only and question+answer similarity, so asking a stored question again
+    scores ~1.0 and can be answered as-is."""
+
+    _TOKEN = re.compile(r"\w+", re.UNICODE)
+
+    def __init__(self, path: str | None, dim: int = 4096):
+        self.path, self.dim = path, dim
+        self.data: _KBData | None = None
+        self.stats = {"direct": 0, "augmented": 0, "miss": 0}
+
+    def __len__(self) -> int:
+        data = self.data
+        return len(data.entries) if data is not None else 0
+
+    @property
+    def enabled(self) -> bool:
+        return len(self) > 0
+
+    def _features(self, text: str) -> list[int]:
+        words = [w for w in self._TOKEN.findall(text.lower()) if len(w) > 1 or w.isdigit()]
+        grams = words + [a + " " + b for a, b in zip(words, words[1:])]
+        return [zlib.crc32(g.encode()) % self.dim for g in grams]
+
+    def _tf(self, text: str):
+        v = np.zeros(self.dim, dtype=np.float32)
+        np.add.at(v, self._features(text), 1.0)
+        nz = v > 0
+        v[nz] = 1.0 + np.log(v[nz])  # sublinear tf
+        return v
+
+    @staticmethod
+    def _read(path: str) -> list[tuple[str, str, str]]:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = f.read()
+        if path.endswith((".json", ".jsonl")):
+            rows = json.loads(raw) if path.endswith(".json") else [json.loads(l) for l in raw.splitlines() if l.strip()]
+            out = []
+            for r in rows:
+                q, a = str(r.get("q", "")).strip(), str(r.get("a", "")).strip()
+                text = str(r.get("text", "")).strip() or f"{q}\n{a}".strip()
+                if text:
+                    out.append((q, a, text))
             return out
-        last_err = (m, out)
-        if out and "model" not in out.lower() and "invalid" not in out.lower():
-            break
-    if last_err:
-        bad_model, msg = last_err
-        return (
-            f"OpenAI error with model **{bad_model}**: {msg}\n"
-            "Tip: set `OPENAI_MODEL` to a model your account has access to "
-            "(e.g., `gpt-4o-2024-11-20` or `gpt-4o-mini-2024-07-18`)."
-        )
-    return "Unknown OpenAI error."
+        return [("", "", p.strip()) for p in re.split(r"\n\s*\n", raw) if p.strip()]
+
+    def load(self) -> int:
+        """Blocking (file read + vectorising); run it in an executor."""
+        if not self.path or np is None:
+            return 0
+        entries = self._read(self.path)
+        if not entries:
+            return 0
+        tf = np.stack([self._tf(text) for _, _, text in entries])
+        df = np.count_nonzero(tf, axis=0)
+        idf = (np.log((1 + len(entries)) / (1 + df)) + 1.0).astype(np.float32)
+
+        def weigh(rows):
+            m = rows * idf
+            m /= np.maximum(np.linalg.norm(m, axis=1, keepdims=True), 1e-9)
+            return m
+
+        qm = weigh(np.stack([self._tf(q) for q, _, _ in entries]))
+        # built on an executor thread: publish with one assignment so search() on the loop
+        # never sees new entries next to old matrices
+        self.data = _KBData(entries, idf, weigh(tf), qm)
+        return len(entries)
+
+    def search(self, query: str, k: int = 3) -> list[_KBHit]:
+        data = self.data  # one snapshot for the whole lookup
+        if data is None or not data.entries:
+            return []
+        q = self._tf(query) * data.idf
+        norm = float(np.linalg.norm(q))
+        if norm == 0.0:
+            return []
+        q /= norm
+        qscores = data.qmatrix @ q
+        scores = np.maximum(data.matrix @ q, qscores)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [_KBHit(float(scores[i]), float(qscores[i]), *data.entries[i]) for i in top]
+
+def _kb_context(hits: list[_KBHit]) -> str:
+    """System-prompt addendum with the retrieved squad notes."""
+    notes = []
+    for h in hits:
+        body = f"Q: {h.question}\nA: {h.answer}" if h.question and h.answer else h.text
+        notes.append("- " + body[:ASK_KB_SNIPPET_CHARS].replace("\n", "\n  "))
+    return ("\n\nSquad notes (our own past answers; prefer them when relevant, "
+            "don't mention them if not):\n" + "\n".join(notes))
+
+class _StreamingReply:
+    """Followup that appears on the first chunk and is then edited at most every ASK_STREAM_EDIT_S."""
+
+    def __init__(self, cog: "Ask", interaction: discord.Interaction, header: str):
+        self.cog, self.interaction, self.header = cog, interaction, header
+        self.msg: discord.WebhookMessage | None = None
+        self.via_original = False  # set once the "thinking" message was edited (queue status)
+        self.shown = ""
+        self.last_edit = 0.0
+        self.broken = False  # a streaming edit failed: skip the rest, finish() still tries
+
+    def _render(self, body: str, cursor: bool) -> str:
+        text = self.header + body + (" ▌" if cursor else "")
+        return text[:DISCORD_MSG_LIMIT]
+
+    async def queued(self, position: int):
+        self.via_original = True
+        text = f"⏳ The LLM is busy — you're **#{position}** in line."
+        await self.cog._send(self.interaction, lambda: self.interaction.edit_original_response(content=text))
+
+    async def update(self, partial: str):
+        now = time.monotonic()
+        if self.broken or ((self.msg is not None or self.via_original) and now - self.last_edit < ASK_STREAM_EDIT_S):
+            return
+        try:
+            await self._show(self._render(partial, cursor=True))
+        except Exception as e:
+            # a display problem must not abort the upstream answer (or its coalesced askers)
+            self.broken = True
+            print(f"[ask] streaming edit FAILED, continuing without: {e.__class__.__name__}: {e}", flush=True)
+            return
+        self.last_edit = now
+
+    async def finish(self, final: str):
+        text = self._render(final, cursor=False)
+        if text != self.shown:
+            await self._show(text)
+
+    async def _show(self, text: str):
+        if self.via_original:
+            await self.cog._send(self.interaction, lambda: self.interaction.edit_original_response(content=text))
+        elif self.msg is None:
+            self.msg = await self.cog._send(self.interaction, lambda: self.interaction.followup.send(text, wait=True))
+        else:
+            msg = self.msg
+            await self.cog._send(self.interaction, lambda: msg.edit(content=text))
+        self.shown = text
 
 class Ask(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.session: aiohttp.ClientSession | None = None
+        self.cache = _ResponseCache(ASK_CACHE_SIZE, ASK_CACHE_TTL_S, ASK_CACHE_FILE)
+        self._inflight: set[asyncio.Task] = set()  # running /ask handlers, for drain()
+        self.kb = _KnowledgeIndex(ASK_KB_FILE, ASK_KB_DIM)
+        self.memory = _ConversationMemory(ASK_MEMORY_TURNS, ASK_MEMORY_MAX_TOKENS, ASK_MEMORY_TTL_S)
+        self.usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+
+    async def cog_load(self):
+        self.session = _make_session()
+        self.cache.load()
+        await self.load_kb()
+
+    async def load_kb(self) -> int:
+        if not ASK_KB_FILE:
+            return 0
+        if np is None:
+            print("[ask] ASK_KB_FILE set but numpy is not installed; knowledge index off", flush=True)
+            return 0
+        try:
+            n = await asyncio.get_running_loop().run_in_executor(None, self.kb.load)
+        except Exception as e:
+            print(f"[ask] knowledge index load FAILED ({ASK_KB_FILE}): {e}", flush=True)
+            return 0
+        print(f"[ask] knowledge index: {n} entries from {ASK_KB_FILE}", flush=True)
+        return n
+
+    async def cog_unload(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.cache.save)
+        except Exception as e:
+            print(f"[ask] cache save FAILED: {e}", flush=True)
 
     @app_commands.command(description="Ask the LLM (funny + a little spicy).")
     @app_commands.describe(q="Your question")
     async def ask(self, interaction: discord.Interaction, q: str):
+        task = asyncio.current_task()
+        self._inflight.add(task)
+        try:
+            await self._answer(interaction, q)
+        except asyncio.CancelledError:
+            # cut off by a shutdown drain: don't leave the user staring at "thinking…"
+            try:
+                await asyncio.wait_for(interaction.edit_original_response(
+                    content="🔄 Bot is restarting — please ask again in a minute."), 2)
+            except Exception:
+                pass
+            raise
+        finally:
+            self._inflight.discard(task)
+
+    async def drain(self, timeout: float) -> int:
+        """Wait up to `timeout` for in-flight /ask calls, then cancel the rest.
+        Returns how many had to be cancelled."""
+        pending = {t for t in self._inflight if not t.done()}
+        if pending:
+            _, pending = await asyncio.wait(pending, timeout=max(0.0, timeout))
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        return len(pending)
+
+    async def _answer(self, interaction: discord.Interaction, q: str):
         # Optional: lock to a single channel
         if ASK_CHANNEL_ID and str(interaction.channel_id) != ASK_CHANNEL_ID:
             return await interaction.response.send_message(
                 f"Use this in <#{ASK_CHANNEL_ID}>.", ephemeral=True
             )
 
-        # Per-user cooldown
+        # Cooldowns: per user, plus optional per channel / per guild
         now = time.time()
-        last = _last_ask_time.get(interaction.user.id, 0)
-        if now - last < ASK_COOLDOWN_S:
+        scopes = _cooldown_scopes(interaction)
+        wait = _cooldowns.remaining([key for key, _ in scopes], now)
+        if wait > 0:
             return await interaction.response.send_message(
-                f"Cooldown — try again in {int(ASK_COOLDOWN_S - (now - last))}s.",
+                f"Cooldown — try again in {int(wait) + 1}s.",
                 ephemeral=True
             )
-        _last_ask_time[interaction.user.id] = now
+        for key, duration in scopes:
+            _cooldowns.hit(key, duration, now)
 
         # Detect NSFW channel if available (tones down if not NSFW)
         nsfw_ok = True
@@ -143,10 +986,141 @@ class Ask(commands.Cog):
                 nsfw_ok = False
 
         sysmsg = _persona_text(SPICE_LEVEL, nsfw_ok)
+        question = _trim_to_tokens(q, ASK_QUESTION_TOKENS)
+        channel_id = interaction.channel_id
+
+        # Squad notes first: a near-exact question match is answered locally, weaker ones
+        # (e.g. the same question about a different topic) only become context
+        hits = self.kb.search(q, ASK_KB_TOP_K)
+        if hits and hits[0].qscore >= ASK_KB_ANSWER and hits[0].answer:
+            self.kb.stats["direct"] += 1
+            self.memory.add(channel_id, question, hits[0].answer, now)
+            return await interaction.response.send_message(
+                f"**Q:** {q[:ASK_MAX_CHARS]}\n**A:** 📚 {hits[0].answer}"[:DISCORD_MSG_LIMIT]
+            )
+        hits = [h for h in hits if h.score >= ASK_KB_MIN]
+        if hits:
+            self.kb.stats["augmented"] += 1
+            sysmsg += _kb_context(hits)
+        elif self.kb.enabled:
+            self.kb.stats["miss"] += 1
 
         await interaction.response.defer(thinking=True)
-        answer = await _openai_complete(q, sysmsg)
-        await interaction.followup.send(f"**Q:** {q[:ASK_MAX_CHARS]}\n**A:** {answer}")
+        header = f"**Q:** {q[:ASK_MAX_CHARS]}\n**A:** "
+        reply = _StreamingReply(self, interaction, header)
+        on_delta = reply.update if ASK_STREAM else None
+        _queue_feedback.set(reply.queued)
+        report: dict = {}
+        _usage_report.set(report)
+
+        # Recent turns in this channel, newest first, as far as the prompt budget allows
+        history = _fit_history(self.memory.history(channel_id, now),
+                               ASK_CONTEXT_TOKENS - _prompt_tokens(question, sysmsg))
+
+        # A follow-up ("why?", "and for gauls?") means something else in every conversation, so
+        # mid-conversation questions neither read nor fill the cache. Memory is opt-in
+        # (ASK_MEMORY_TURNS), so by default every question is cacheable.
+        if history or not self.cache.enabled or str(channel_id) in ASK_CACHE_BYPASS_CHANNELS:
+            ok, answer = await _openai_complete(self.session, question, sysmsg, on_delta, history)
+        else:
+            key = _cache_key(question, sysmsg)
+            answer, ok = self.cache.get(key), True
+            if answer is None:
+                # only the first asker streams; identical concurrent askers get the final text
+                ok, answer = await self.cache.single_flight(
+                    key, lambda: _openai_complete(self.session, question, sysmsg, on_delta=on_delta)
+                )
+        if ok:
+            self.memory.add(channel_id, question, answer, time.time())
+        await reply.finish(answer + self._account_usage(report, question, sysmsg, history, answer))
+
+    def _account_usage(self, report: dict, question: str, sysmsg: str,
+                       history: tuple[_Turn, ...], answer: str) -> str:
+        """Log prompt size and cost of an upstream answer; returns the optional reply footer."""
+        if "model" not in report:  # cache hit or error: nothing was billed to this request
+            return ""
+        usage = report["usage"]
+        prompt_t = usage.get("prompt_tokens") or _prompt_tokens(question, sysmsg, history)
+        completion_t = usage.get("completion_tokens") or _count_tokens(answer)
+        cost = (prompt_t * ASK_PRICE_IN_PER_M + completion_t * ASK_PRICE_OUT_PER_M) / 1e6
+        self.usage["requests"] += 1
+        self.usage["prompt_tokens"] += prompt_t
+        self.usage["completion_tokens"] += completion_t
+        self.usage["cost_usd"] += cost
+        print(f"[ask] {report['model']}: prompt {prompt_t} tok (system {_count_tokens(sysmsg)}, "
+              f"history {len(history)} turns/{sum(t.tokens for t in history)}, "
+              f"question {_count_tokens(question)}) + completion {completion_t} tok = ${cost:.5f}", flush=True)
+        return f"\n-# {prompt_t} + {completion_t} tokens · ${cost:.4f}" if ASK_SHOW_COST else ""
+
+    @app_commands.command(name="ask_stats", description="(Admin) /ask cache statistics")
+    @app_commands.default_permissions(manage_guild=True)
+    async def ask_stats(self, interaction: discord.Interaction):
+        st = self.cache.stats
+        lookups = st["hits"] + st["misses"]
+        rate = f"{100 * st['hits'] / lookups:.0f}%" if lookups else "n/a"
+        await interaction.response.send_message(
+            f"🗃️ /ask cache: **{len(self.cache)}**/{ASK_CACHE_SIZE} entries, TTL {ASK_CACHE_TTL_S}s\n"
+            f"Hits **{st['hits']}**, misses **{st['misses']}** (hit rate {rate}), "
+            f"coalesced in-flight **{st['coalesced']}**\n"
+            f"Quota: **{_quota.active}**/{_quota.max_concurrent} in flight, **{_quota.queued()}** queued, "
+            f"{_quota.stats['rate_limited']} upstream 429s, {_quota.stats['rejected']} rejected\n"
+            f"Notes index: **{len(self.kb)}** entries — {self.kb.stats['direct']} answered locally, "
+            f"{self.kb.stats['augmented']} with context, {self.kb.stats['miss']} no match\n"
+            f"Memory: **{len(self.memory)}** channels, {self.memory.tokens}/{ASK_MEMORY_MAX_TOKENS} tokens, "
+            f"{self.memory.stats['evicted']} evicted\n"
+            f"Usage: {self.usage['prompt_tokens']} prompt + {self.usage['completion_tokens']} completion tokens "
+            f"over {self.usage['requests']} calls ≈ **${self.usage['cost_usd']:.4f}**\n"
+            + _health_lines(),
+            ephemeral=True
+        )
+
+    @app_commands.command(name="ask_forget", description="Forget the /ask conversation in this channel")
+    async def ask_forget(self, interaction: discord.Interaction):
+        n = self.memory.forget(interaction.channel_id)
+        await interaction.response.send_message(
+            f"🧹 Forgot {n} earlier question{'s' if n != 1 else ''} here." if n else "Nothing to forget here.",
+            ephemeral=True
+        )
+
+    @app_commands.command(name="ask_kb_reload", description="(Admin) Reload the /ask squad notes index")
+    @app_commands.default_permissions(manage_guild=True)
+    async def ask_kb_reload(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        n = await self.load_kb()
+        await interaction.followup.send(
+            f"📚 Notes index: **{n}** entries loaded." if n else "📚 Notes index not loaded (see logs).",
+            ephemeral=True
+        )
+
+    def metrics_snapshot(self) -> dict:
+        """Counters for onbot's /metrics endpoint."""
+        return {
+            "models": {
+                m: {"requests": h.requests, "errors": h.errors, "state": h.state,
+                    "p50": h.latency_pct(0.5), "p95": h.latency_pct(0.95)}
+                for m, h in _health.items()
+            },
+            "cache": dict(self.cache.stats, size=len(self.cache)),
+            "quota": dict(_quota.stats, active=_quota.active, queued=_quota.queued()),
+            "cooldowns": len(_cooldowns),
+            "kb": dict(self.kb.stats, entries=len(self.kb)),
+            "usage": dict(self.usage),
+            "memory": dict(self.memory.stats, channels=len(self.memory), tokens=self.memory.tokens),
+        }
+
+    async def _send(self, interaction: discord.Interaction, factory):
+        outbound = getattr(self.bot, "outbound", None)  # onbot's rate-limit-aware queue
+        if outbound is not None:
+            return await outbound.send(f"interaction:{interaction.id}", factory)
+        return await factory()
+
+def _health_lines() -> str:
+    lines = []
+    for m, h in _health.items():
+        p50, p95 = h.latency_pct(0.5), h.latency_pct(0.95)
+        lat = f"p50 {p50*1000:.0f}ms / p95 {p95*1000:.0f}ms" if p50 is not None else "no latency yet"
+        lines.append(f"`{m}` — {h.state}, {h.requests} req, {h.error_rate():.0%} err, {lat}")
+    return "\n".join(lines) or "No model calls yet."
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Ask(bot))
@@ -0,0 +1,272 @@
+# bench.py — offline micro-benchmarks for the bot's hot paths.
+# Usage:
+#   python bench.py state [--guilds 5000] [--saves 200] [--backend json|sqlite]
+#   python bench.py session [--requests 200] [--latency-ms 5]
+#   python bench.py routing [--requests 50] [--latency-ms 20]
+#   python bench.py cooldown [--users 1000000] [--per-second 200]
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+from aiohttp import web
+from state_store import open_store
+
+def _fake_state(n: int) -> dict:
+    now = int(time.time())
+    return {
+        str(100000000000000000 + i): {
+            "user_id": 200000000000000000 + i, "activity": "farming", "note": "lists",
+            "since": now, "for_min": 90, "updates_enabled": bool(i % 2), "interval_min": 60,
+            "channel_id": 300000000000000000 + i, "ping_here": False,
+        }
+        for i in range(n)
+    }
+
+async def _lag_probe(stop: asyncio.Event, samples: list[float], period: float = 0.001):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(period)
+        samples.append(max(0.0, loop.time() - t0 - period))
+
+async def _drive(save, n_saves: int) -> tuple[float, float, float]:
+    """Return (total time blocked inside save calls, worst probe lag, p99 probe lag)."""
+    stop, samples = asyncio.Event(), []
+    probe = asyncio.create_task(_lag_probe(stop, samples))
+    blocked = 0.0
+    for i in range(n_saves):
+        t0 = time.perf_counter()
+        save(i)
+        blocked += time.perf_counter() - t0
+        await asyncio.sleep(0.002)  # commands arrive spread out, not back-to-back
+    stop.set()
+    await probe
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99)] if samples else 0.0
+    return blocked, (samples[-1] if samples else 0.0), p99
+
+async def bench_state(guilds: int, saves: int, backend: str) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        data = _fake_state(guilds)
+        keys = list(data)
+
+        path = os.path.join(tmp, "sync.json")
+        def sync_save(i):
+            data[keys[i % len(keys)]]["note"] = f"n{i}"
+            with open(path, "w") as f:
+                json.dump(data, f)
+        before = await _drive(sync_save, saves)
+
+        path = os.path.join(tmp, "store.json")
+        with open(path, "w") as f:
+            json.dump(_fake_state(guilds), f)
+        store = open_store(backend, path, flush_delay=0.05)
+        store.start()
+        skeys = list(store.data)
+        def store_save(i):
+            gid = skeys[i % len(skeys)]
+            store.data[gid]["note"] = f"n{i}"
+            store.mark_dirty(gid)
+        after = await _drive(store_save, saves)
+        await store.close()
+
+    print(f"state: {guilds} guilds, {saves} saves, backend={backend}")
+    print(f"  {'':14}{'blocked total':>15}{'max lag':>12}{'p99 lag':>12}")
+    for name, (blocked, worst, p99) in (("sync save", before), ("write-behind", after)):
+        print(f"  {name:14}{blocked*1000:12.1f} ms{worst*1000:9.2f} ms{p99*1000:9.2f} ms")
+    print(f"  background writes: {store.writes} (coalesced from {saves} saves)")
+
+# ---------- fake OpenAI ----------
+def fake_openai_app(latency_s: float = 0.0, error_rate: float = 0.0,
+                    broken_models: tuple[str, ...] = (), slow_models: dict[str, float] | None = None,
+                    rate_limit_every: int = 0, seed: int = 0) -> web.Application:
+    """Minimal /v1/chat/completions stub answering after `latency_s` (supports `stream: true`).
+    `broken_models` always 404, `slow_models` add per-model delay, `error_rate` injects 500s,
+    and every `rate_limit_every`-th request gets a 429 with a short Retry-After.
+    Per-model request counts are kept in app["calls"]."""
+    import random
+    answer = "lists won't click themselves"
+    rng = random.Random(seed)
+    slow_models = slow_models or {}
+    calls: dict[str, int] = {}
+
+    async def completions(request: web.Request):
+        body = await request.json()
+        model = body.get("model", "")
+        calls[model] = calls.get(model, 0) + 1
+        if rate_limit_every and sum(calls.values()) % rate_limit_every == 0:
+            return web.json_response({"error": {"message": "Rate limit reached", "type": "requests"}},
+                                     status=429, headers={"Retry-After": "0.2"})
+        await asyncio.sleep(latency_s + slow_models.get(model, 0.0))
+        if model in broken_models:
+            return web.json_response(
+                {"error": {"message": f"The model `{model}` does not exist", "type": "invalid_request_error"}},
+                status=404)
+        if error_rate and rng.random() < error_rate:
+            return web.json_response({"error": {"message": "The server had an error", "type": "server_error"}},
+                                     status=500)
+        if body.get("stream"):
+            resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await resp.prepare(request)
+            for word in answer.split(" "):
+                chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+                await resp.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                await asyncio.sleep(latency_s / 4)
+            await resp.write(b"data: [DONE]\n\n")
+            await resp.write_eof()
+            return resp
+        return web.json_response({
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}}],
+            "usage": {"prompt_tokens": 50, "completion_tokens": 8, "total_tokens": 58},
+        })
+    app = web.Application()
+    app["calls"] = calls
+    app.router.add_post("/v1/chat/completions", completions)
+    return app
+
+async def start_fake_openai(app: web.Application) -> tuple[web.AppRunner, str]:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}/v1"
+
+def _pct(xs: list[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * q))] if xs else 0.0
+
+async def bench_session(requests: int, latency_ms: float) -> None:
+    import aiohttp
+    runner, base = await start_fake_openai(fake_openai_app(latency_ms / 1000))
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ["OPENAI_BASE_URL"] = base
+    import ask  # reads OPENAI_BASE_URL at import
+
+    async def fresh(model, prompt, sysmsg):
+        # what _try_openai used to do: new session (new TCP/TLS) per attempt
+        async with aiohttp.ClientSession() as sess:
+            return await ask._try_openai(sess, model, prompt, sysmsg)
+
+    shared = ask._make_session()
+    async def pooled(model, prompt, sysmsg):
+        return await ask._try_openai(shared, model, prompt, sysmsg)
+
+    print(f"session: {requests} sequential requests, stub latency {latency_ms}ms")
+    for name, call in (("fresh session", fresh), ("shared pool", pooled)):
+        lat = []
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            ok, _ = await call("gpt-4o-mini", "how fast are TTs?", "sys")
+            lat.append(time.perf_counter() - t0)
+            assert ok
+        print(f"  {name:14} mean {sum(lat)/len(lat)*1000:7.2f} ms  p50 {_pct(lat, .5)*1000:7.2f} ms"
+              f"  p99 {_pct(lat, .99)*1000:7.2f} ms")
+    await shared.close()
+    await runner.cleanup()
+
+async def bench_routing(requests: int, latency_ms: float) -> None:
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    import ask
+    primary = ask.PRIMARY_MODEL
+
+    async def run(label: str, app: web.Application, reset_health: bool, hedge_ms: int = 0):
+        runner, base = await start_fake_openai(app)
+        ask.OPENAI_BASE_URL, ask.ASK_HEDGE_MS = base, hedge_ms
+        ask._health.clear()
+        # the default ASK_RPM quota would throttle the stub; measure routing only
+        ask._quota = ask._QuotaManager(256, 10**6, 10**9, 10**5)
+        sess = ask._make_session()
+        lat = []
+        for _ in range(requests):
+            if reset_health:
+                ask._health.clear()
+            t0 = time.perf_counter()
+            ok, _ = await ask._openai_complete(sess, "farm list tips?", "sys")
+            lat.append(time.perf_counter() - t0)
+            assert ok
+        await sess.close()
+        await runner.cleanup()
+        print(f"  {label:30} mean {sum(lat)/len(lat)*1000:7.1f} ms  p95 {_pct(lat, .95)*1000:7.1f} ms"
+              f"  calls {dict(app['calls'])}")
+
+    lat_s = latency_ms / 1000
+    print(f"routing: {requests} requests, stub latency {latency_ms}ms")
+    await run("broken primary, no breaker", fake_openai_app(lat_s, broken_models=(primary,)), True)
+    await run("broken primary, breaker", fake_openai_app(lat_s, broken_models=(primary,)), False)
+    slow = {primary: 10 * lat_s}
+    await run("slow primary, no hedge", fake_openai_app(lat_s, slow_models=slow), False)
+    await run("slow primary, hedge 2x latency", fake_openai_app(lat_s, slow_models=slow), False,
+              hedge_ms=int(2 * latency_ms))
+
+def bench_cooldown(users: int, per_second: float) -> None:
+    import tracemalloc
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    import ask
+    cooldown = ask.ASK_COOLDOWN_S
+
+    def run_dict():
+        last: dict[int, float] = {}  # the old _last_ask_time
+        for i in range(users):
+            now = i / per_second
+            if now - last.get(i, 0) >= cooldown:
+                last[i] = now
+        return last
+
+    def run_expiring():
+        cd = ask._Cooldowns()
+        for i in range(users):
+            now = i / per_second
+            key = ("user", i)
+            if cd.remaining([key], now) <= 0:
+                cd.hit(key, cooldown, now)
+        return cd
+
+    print(f"cooldown: {users} distinct users, {per_second}/s, cooldown {cooldown}s")
+    for name, fn in (("plain dict", run_dict), ("expiring", run_expiring)):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        tracemalloc.start()  # second pass: tracemalloc would skew the timing
+        obj = fn()
+        cur, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {name:11} {dt / users * 1e9:7.0f} ns/ask  entries {len(obj):>9}"
+              f"  retained {cur / 1e6:8.2f} MB  peak {peak / 1e6:8.2f} MB")
+        del obj
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("state", help="loop blocking of save_state before/after write-behind")
+    p.add_argument("--guilds", type=int, default=5000)
+    p.add_argument("--saves", type=int, default=200)
+    p.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    p = sub.add_parser("session", help="/ask HTTP latency: fresh session per call vs shared pool")
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--latency-ms", type=float, default=5.0)
+    p = sub.add_parser("routing", help="circuit breaker + hedging against a faulty stub")
+    p.add_argument("--requests", type=int, default=50)
+    p.add_argument("--latency-ms", type=float, default=20.0)
+    p = sub.add_parser("cooldown", help="/ask cooldown table memory + lookup cost at scale")
+    p.add_argument("--users", type=int, default=1_000_000)
+    p.add_argument("--per-second", type=float, default=200.0)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "state":
+        asyncio.run(bench_state(args.guilds, args.saves, args.backend))
+    elif args.cmd == "session":
+        asyncio.run(bench_session(args.requests, args.latency_ms))
+    elif args.cmd == "routing":
+        asyncio.run(bench_routing(args.requests, args.latency_ms))
+    elif args.cmd == "cooldown":
+        bench_cooldown(args.users, args.per_second)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
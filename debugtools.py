@@ -0,0 +1,115 @@
+# debugtools.py — find what is stalling the event loop.
+#
+# SlowCallbackDetector: times every loop callback (the same hook asyncio debug mode
+#   uses, without debug mode's overhead) and logs the ones above a threshold,
+#   naming the task/coroutine that ran.
+# dump_tasks(): stack of every pending task, for "what is everything waiting on?".
+# sample_profile(): samples the loop thread's Python stack from a side thread
+#   and writes collapsed stacks ("a;b;c count", flamegraph.pl / speedscope format).
+
+import io
+import os
+import sys
+import time
+import asyncio
+import threading
+import collections
+from asyncio import events
+
+def describe_task(task: asyncio.Task) -> str:
+    coro = task.get_coro()
+    qual = getattr(coro, "__qualname__", None) or type(coro).__qualname__
+    return f"task {task.get_name()} ({qual})"
+
+def describe_callback(handle: asyncio.Handle) -> str:
+    cb = getattr(handle, "_callback", None)
+    task = getattr(cb, "__self__", None)
+    if isinstance(task, asyncio.Task):
+        return describe_task(task)
+    # stable names only (no reprs with addresses): onbot uses them as metric labels
+    while getattr(cb, "func", None) is not None and not hasattr(cb, "__qualname__"):
+        cb = cb.func  # functools.partial and friends
+    return getattr(cb, "__qualname__", None) or type(cb).__qualname__
+
+class SlowCallbackDetector:
+    """Patch asyncio.Handle._run; callbacks slower than `threshold_s` are logged and counted."""
+
+    def __init__(self, threshold_s: float = 0.1, on_slow=None):
+        self.threshold_s = threshold_s
+        self.on_slow = on_slow  # optional (name, seconds) hook, e.g. a metrics counter
+        self.count = 0
+        self.worst: collections.Counter[str] = collections.Counter()
+        self._orig = None
+
+    def install(self) -> None:
+        if self._orig is not None:
+            return
+        orig = self._orig = events.Handle._run
+        detector = self
+
+        def _run(handle):
+            t0 = time.perf_counter()
+            try:
+                return orig(handle)
+            finally:
+                dt = time.perf_counter() - t0
+                if dt >= detector.threshold_s:
+                    detector._report(handle, dt)
+
+        events.Handle._run = _run
+
+    def uninstall(self) -> None:
+        if self._orig is not None:
+            events.Handle._run = self._orig
+            self._orig = None
+
+    def _report(self, handle, dt: float) -> None:
+        try:
+            name = describe_callback(handle)
+        except Exception:
+            name = "?"
+        self.count += 1
+        self.worst[name] = max(self.worst[name], dt)
+        print(f"[slow] {dt*1000:.0f}ms blocking the loop in {name}", flush=True)
+        if self.on_slow is not None:
+            try:
+                self.on_slow(name, dt)
+            except Exception:
+                pass
+
+def dump_tasks() -> str:
+    out = io.StringIO()
+    tasks = sorted(asyncio.all_tasks(), key=lambda t: t.get_name())
+    out.write(f"{len(tasks)} tasks\n")
+    for t in tasks:
+        out.write(f"\n=== {describe_task(t)}\n")
+        t.print_stack(limit=20, file=out)
+    return out.getvalue()
+
+def _collapse(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+def sample_profile(thread_id: int, seconds: float, path: str, interval: float = 0.005) -> tuple[str, int]:
+    """Blocking: sample `thread_id` for `seconds` and write collapsed stacks to `path`.
+    Run it in an executor, never on the thread being sampled."""
+    counts: collections.Counter[str] = collections.Counter()
+    deadline = time.monotonic() + seconds
+    samples = 0
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            counts[_collapse(frame)] += 1
+            samples += 1
+        time.sleep(interval)
+    with open(path, "w") as f:
+        for stack, n in counts.most_common():
+            f.write(f"{stack} {n}\n")
+    return path, samples
+
+def loop_thread_id() -> int:
+    return threading.get_ident()
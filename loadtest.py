@@ -0,0 +1,343 @@
+# loadtest.py — offline load test: real command callbacks, fake Discord, fake OpenAI.
+# Usage:
+#   python loadtest.py commands [--guilds 200] [--ops 20000] [--concurrency 50] [--rate 0]
+#   python loadtest.py ask [--ops 500] [--concurrency 50] [--latency-ms 200] [--distinct 0.3]
+#                          [--error-rate 0] [--no-stream]
+#   common: [--discord-ms 20] [--seed 0]
+#
+# `commands` drives onbot's /on, /status, /updates, /off, /stats and /leaderboard; `ask` drives
+# Ask.ask against bench.fake_openai_app. Interactions, channels and messages are
+# in-memory fakes that answer after --discord-ms, so everything downstream (state
+# store, scheduler, outbound queue, cache, quota, breaker) is the production code.
+# --rate > 0 fires ops open-loop at that many per second; otherwise --concurrency
+# virtual users run back to back. Reports throughput, ack and completion latency
+# (p50/p99), loop lag and memory. No network is touched.
+#
+# The /ask limits are lifted by default so the bot, not the quota, is measured;
+# export ASK_RPM / ASK_MAX_CONCURRENT / ASK_COOLDOWN_S etc. to test real settings.
+
+import os
+import sys
+import time
+import atexit
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import resource
+import itertools
+
+_tmp = tempfile.mkdtemp(prefix="onbot-loadtest-")
+atexit.register(shutil.rmtree, _tmp, ignore_errors=True)
+for _k, _v in {
+    "DISCORD_TOKEN": "loadtest", "OPENAI_API_KEY": "loadtest",
+    "STATE_FILE": os.path.join(_tmp, "state.json"), "SLOW_CALLBACK_MS": "0",
+    "ASK_COOLDOWN_S": "0", "ASK_RPM": "1000000", "ASK_TPM": "1000000000",
+    "ASK_MAX_CONCURRENT": "256", "ASK_QUEUE_MAX": "100000",
+}.items():
+    os.environ.setdefault(_k, _v)
+
+import discord
+from discord import app_commands
+from bench import fake_openai_app, start_fake_openai, _pct
+import onbot
+import ask
+
+# ---------- fake Discord ----------
+class FakeUser:
+    def __init__(self, uid: int):
+        self.id = uid
+        self.mention = f"<@{uid}>"
+
+class FakeGuild:
+    def __init__(self, gid: int, members: dict[int, FakeUser]):
+        self.id = gid
+        self.members = members
+
+    def get_member(self, uid: int):
+        return self.members.get(uid)
+
+class FakeMessage:
+    _ids = itertools.count(900000000000000000)
+
+    def __init__(self, channel: "FakeChannel", content: str):
+        self.id = next(self._ids)
+        self.channel, self.content = channel, content
+
+    async def edit(self, content: str | None = None, **_):
+        await asyncio.sleep(self.channel.latency_s)
+        self.channel.edits += 1
+        self.content = content
+
+class FakeChannel:
+    def __init__(self, cid: int, latency_s: float):
+        self.id = cid
+        self.latency_s = latency_s
+        self.sends = 0
+        self.edits = 0
+        self.messages: dict[int, FakeMessage] = {}
+
+    def is_nsfw(self) -> bool:
+        return False
+
+    async def send(self, content: str, **_):
+        await asyncio.sleep(self.latency_s)
+        self.sends += 1
+        msg = FakeMessage(self, content)
+        self.messages[msg.id] = msg
+        return msg
+
+    def get_partial_message(self, message_id: int):
+        msg = self.messages.get(message_id)
+        if msg is None:
+            raise discord.NotFound(_FakeResponse(404), "Unknown Message")
+        return msg
+
+class _FakeResponse:
+    # enough of aiohttp.ClientResponse for discord.HTTPException.__init__
+    def __init__(self, status: int):
+        self.status = status
+        self.reason = "Not Found"
+
+class FakeInteractionResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    def _ack(self):
+        if self._done:
+            raise discord.InteractionResponded(self.interaction)
+        self._done = True
+        self.interaction.acked_at = time.perf_counter()
+
+    async def send_message(self, content: str | None = None, **_):
+        await asyncio.sleep(self.interaction.channel.latency_s)
+        self._ack()
+        self.interaction.replies.append(content)
+
+    async def defer(self, **_):
+        await asyncio.sleep(self.interaction.channel.latency_s)
+        self._ack()
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+
+    async def send(self, content: str, **_):
+        return await self.interaction.channel.send(content)
+
+class FakeInteraction:
+    _ids = itertools.count(800000000000000000)
+
+    def __init__(self, guild: FakeGuild, channel: FakeChannel, user: FakeUser):
+        self.id = next(self._ids)
+        self.guild, self.guild_id = guild, guild.id
+        self.channel, self.channel_id = channel, channel.id
+        self.user = user
+        self.command = None
+        self.created_at = discord.utils.utcnow()
+        self.response = FakeInteractionResponse(self)
+        self.followup = FakeFollowup(self)
+        self.replies: list[str | None] = []
+        self.acked_at: float | None = None
+
+    async def edit_original_response(self, content: str | None = None, **_):
+        await asyncio.sleep(self.channel.latency_s)
+        self.replies.append(content)
+
+class World:
+    """Guilds with a few members and one channel each, wired into onbot.client.get_channel."""
+
+    def __init__(self, guilds: int, members: int, latency_s: float, rng: random.Random):
+        self.rng = rng
+        self.channels: dict[int, FakeChannel] = {}
+        self.guilds: list[tuple[FakeGuild, FakeChannel]] = []
+        for g in range(guilds):
+            gid = 100000000000000000 + g
+            users = {uid: FakeUser(uid) for uid in range(200000000000000000 + g * members,
+                                                         200000000000000000 + (g + 1) * members)}
+            channel = FakeChannel(300000000000000000 + g, latency_s)
+            self.channels[channel.id] = channel
+            self.guilds.append((FakeGuild(gid, users), channel))
+        onbot.client.get_channel = self.channels.get
+
+    def interaction(self) -> FakeInteraction:
+        guild, channel = self.rng.choice(self.guilds)
+        user = self.rng.choice(list(guild.members.values()))
+        return FakeInteraction(guild, channel, user)
+
+    def messages_sent(self) -> tuple[int, int]:
+        return sum(c.sends for c in self.channels.values()), sum(c.edits for c in self.channels.values())
+
+# ---------- driver ----------
+class Recorder:
+    def __init__(self):
+        self.done: dict[str, list[float]] = {}
+        self.ack: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    async def run(self, name: str, interaction: FakeInteraction, coro) -> None:
+        t0 = time.perf_counter()
+        try:
+            await coro
+        except Exception as e:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            if self.errors[name] == 1:
+                print(f"  [{name}] {type(e).__name__}: {e}", flush=True)
+            return
+        self.done.setdefault(name, []).append(time.perf_counter() - t0)
+        if interaction.acked_at is not None:
+            self.ack.setdefault(name, []).append(interaction.acked_at - t0)
+
+async def drive(make_op, ops: int, concurrency: int, rate: float, rng: random.Random) -> float:
+    """Run `ops` operations; returns wall time. `make_op()` returns an awaitable."""
+    t0 = time.perf_counter()
+    if rate > 0:
+        tasks = []
+        for _ in range(ops):
+            tasks.append(asyncio.create_task(make_op()))
+            await asyncio.sleep(rng.expovariate(rate))
+        await asyncio.gather(*tasks)
+    else:
+        counter = itertools.count()
+        async def user():
+            while next(counter) < ops:
+                await make_op()
+        await asyncio.gather(*(user() for _ in range(max(1, concurrency))))
+    return time.perf_counter() - t0
+
+def _rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def report(title: str, rec: Recorder, wall: float, extra: list[str]) -> None:
+    total = sum(len(v) for v in rec.done.values())
+    print(f"\n{title}")
+    print(f"  {total} ops in {wall:.2f}s -> {total / wall:,.0f} ops/s"
+          f"  errors {sum(rec.errors.values())}  {dict(rec.errors) if rec.errors else ''}")
+    print(f"  {'command':10}{'n':>8}{'ack p50':>11}{'ack p99':>11}{'done p50':>11}{'done p99':>11}")
+    for name in sorted(rec.done):
+        d, a = rec.done[name], rec.ack.get(name, [])
+        print(f"  {name:10}{len(d):>8}{_pct(a, .5)*1000:9.1f}ms{_pct(a, .99)*1000:9.1f}ms"
+              f"{_pct(d, .5)*1000:9.1f}ms{_pct(d, .99)*1000:9.1f}ms")
+    print(f"  loop lag max {onbot.lag_monitor.max*1000:.1f}ms  peak RSS {_rss_mb():.0f} MB")
+    for line in extra:
+        print(f"  {line}")
+
+async def _start_runtime():
+    onbot.store.start()
+    onbot.shifts.start()
+    onbot.scheduler.start()
+    onbot.outbound.start()
+    onbot.lag_monitor.start()
+
+async def _stop_runtime():
+    await onbot.lag_monitor.close()
+    await onbot.scheduler.close()
+    await onbot.outbound.close()
+    await onbot.shifts.close()
+    await onbot.store.close()
+
+def _choice(value: str) -> app_commands.Choice[str]:
+    return app_commands.Choice(name=value, value=value)
+
+ACTIVITIES = [c.value for c in onbot.ACTIVITY_CHOICES]
+ACCOUNTS = [None, None, "alt", "wing 2"]  # None = default slot / the one the user sits
+
+async def load_commands(args) -> None:
+    rng = random.Random(args.seed)
+    world = World(args.guilds, args.members, args.discord_ms / 1000, rng)
+    rec = Recorder()
+    await _start_runtime()
+
+    def make_op():
+        it = world.interaction()
+        r = rng.random()
+        if r < 0.35:
+            return rec.run("on", it, onbot.on.callback(
+                it, _choice(rng.choice(ACTIVITIES)), note="farm lists", for_min=rng.choice((None, 30, 90)),
+                account=rng.choice(ACCOUNTS)))
+        if r < 0.70:
+            return rec.run("status", it, onbot.status.callback(it))
+        if r < 0.80:
+            mode = rng.choice(("on", "live", "off"))
+            return rec.run("updates", it, onbot.updates.callback(it, _choice(mode), interval=5,
+                                                                 account=rng.choice(ACCOUNTS)))
+        if r < 0.95:
+            return rec.run("off", it, onbot.off.callback(it))
+        if r < 0.98:
+            return rec.run("stats", it, onbot.stats.callback(it))
+        return rec.run("leaderboard", it, onbot.leaderboard.callback(it))
+
+    wall = await drive(make_op, args.ops, args.concurrency, args.rate, rng)
+    await onbot.store.flush()
+    sends, edits = world.messages_sent()
+    report(f"commands: {args.guilds} guilds x {args.members} members, discord latency {args.discord_ms}ms", rec, wall, [
+        f"state: {len(onbot.state)} slots in {len(onbot.slots.by_guild)} guilds, {onbot.store.writes} background writes"
+        f" (last {onbot.store.last_write_s*1000:.1f}ms)",
+        f"scheduler: {len(onbot.scheduler)} pending updates; channel sends {sends}, edits {edits}",
+        f"outbound: {onbot.outbound.stats}",
+        f"shift log: {onbot.shifts.data.get('_seq', 0)} shifts recorded, {onbot.shifts.records} on disk",
+    ])
+    await _stop_runtime()
+
+QUESTIONS = ["how fast are TTs", "farm list tips", "best hero items", "when to settle",
+             "how do I defend a WW", "oasis animals", "crop fields first?", "artefacts explained"]
+
+async def load_ask(args) -> None:
+    rng = random.Random(args.seed)
+    app = fake_openai_app(args.latency_ms / 1000, error_rate=args.error_rate, seed=args.seed)
+    runner, base = await start_fake_openai(app)
+    ask.OPENAI_BASE_URL = base
+    ask.ASK_STREAM = not args.no_stream
+    world = World(args.guilds, args.members, args.discord_ms / 1000, rng)
+    cog = ask.Ask(onbot.client)
+    await cog.cog_load()
+    rec = Recorder()
+    await _start_runtime()
+    n = itertools.count()
+
+    def make_op():
+        it = world.interaction()
+        # `distinct` of the questions are new; the rest repeat a popular one (cache / single-flight)
+        q = f"{rng.choice(QUESTIONS)} #{next(n)}" if rng.random() < args.distinct else rng.choice(QUESTIONS)
+        return rec.run("ask", it, ask.Ask.ask.callback(cog, it, q))
+
+    wall = await drive(make_op, args.ops, args.concurrency, args.rate, rng)
+    sends, edits = world.messages_sent()
+    report(f"ask: stub latency {args.latency_ms}ms, error rate {args.error_rate:.0%}, "
+           f"{'stream' if ask.ASK_STREAM else 'no stream'}, discord latency {args.discord_ms}ms", rec, wall, [
+        f"upstream calls {sum(app['calls'].values())} {dict(app['calls'])}",
+        f"cache {cog.cache.stats}  quota {ask._quota.stats}",
+        f"followups {sends}, edits {edits}; outbound {onbot.outbound.stats}",
+    ])
+    await cog.cog_unload()
+    await _stop_runtime()
+    await runner.cleanup()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="offline load test for onbot + ask")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name, ops, conc in (("commands", 20000, 50), ("ask", 500, 50)):
+        p = sub.add_parser(name)
+        p.add_argument("--ops", type=int, default=ops)
+        p.add_argument("--concurrency", type=int, default=conc)
+        p.add_argument("--rate", type=float, default=0.0, help="open-loop ops/s (0 = closed loop)")
+        p.add_argument("--guilds", type=int, default=200)
+        p.add_argument("--members", type=int, default=5)
+        p.add_argument("--discord-ms", type=float, default=20.0)
+        p.add_argument("--seed", type=int, default=0)
+        if name == "ask":
+            p.add_argument("--latency-ms", type=float, default=200.0)
+            p.add_argument("--error-rate", type=float, default=0.0)
+            p.add_argument("--distinct", type=float, default=0.3, help="fraction of never-seen questions")
+            p.add_argument("--no-stream", action="store_true")
+    args = ap.parse_args(argv)
+    asyncio.run(load_commands(args) if args.cmd == "commands" else load_ask(args))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,159 @@
+# metrics.py — tiny Prometheus text-format registry + event-loop lag sampler.
+#
+# No client library: counters, gauges and histograms with optional labels,
+# rendered on demand by the /metrics handler in onbot.py. Gauges can be backed
+# by a callback so live values (queue sizes, gateway latency) are read at
+# scrape time instead of being pushed.
+
+import math
+import asyncio
+from typing import Callable
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Gauge(_Metric):
+    """Either `set()` explicitly or pass `fn` returning a number or {label_values: number}."""
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), fn: Callable[[], object] | None = None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+        self.values: dict[tuple, float] = {}
+
+    def set(self, value: float, *label_values) -> None:
+        self.values[label_values] = value
+
+    def render(self) -> list[str]:
+        values = self.values
+        if self.fn is not None:
+            try:
+                got = self.fn()
+            except Exception:
+                got = None
+            if got is None:
+                values = {}
+            elif isinstance(got, dict):
+                values = {k if isinstance(k, tuple) else (k,): v for k, v in got.items()}
+            else:
+                values = {(): got}
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, k)} {_fmt(v)}"
+            for k, v in values.items() if v is not None and not (isinstance(v, float) and math.isnan(v))
+        ]
+
+class Counter(Gauge):
+    """Monotonic; `inc()` it or, like Gauge, back it with `fn` (e.g. an existing stats dict)."""
+    kind = "counter"
+
+    def inc(self, *label_values, amount: float = 1.0) -> None:
+        self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.series: dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *label_values) -> None:
+        s = self.series.get(label_values)
+        if s is None:
+            s = self.series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+        for i, b in enumerate(self.buckets):
+            if value <= b:
+                s[i] += 1
+                break
+        s[-2] += value
+        s[-1] += 1
+
+    def render(self) -> list[str]:
+        out = self.header()
+        names = self.label_names + ("le",)
+        for k, s in self.series.items():
+            cum = 0
+            for i, b in enumerate(self.buckets):
+                cum += s[i]
+                out.append(f"{self.name}_bucket{_labels(names, k + (_fmt(b),))} {cum}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, k)} {_fmt(s[-2])}")
+            out.append(f"{self.name}_count{_labels(self.label_names, k)} {s[-1]}")
+        return out
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[_Metric] = []
+
+    def add(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=(), fn=None) -> Counter:
+        return self.add(Counter(name, help, labels, fn))
+
+    def gauge(self, name, help, labels=(), fn=None) -> Gauge:
+        return self.add(Gauge(name, help, labels, fn))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for m in self.metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+class LoopLagMonitor:
+    """Sleeps `interval` in a loop; how late each wake-up is = how long the loop was blocked."""
+
+    def __init__(self, interval: float = 0.5, histogram: Histogram | None = None):
+        self.interval = interval
+        self.histogram = histogram
+        self.last = 0.0
+        self.max = 0.0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - t0 - self.interval)
+            self.last = lag
+            self.max = max(self.max, lag)
+            if self.histogram is not None:
+                self.histogram.observe(lag)
@@ -1,23 +1,40 @@
 # onbot.py
 # Shared Travian account helper.
-# Commands:
-#   /on activity:<choice> note:<text?> for:<minutes?>
-#   /status
+# Commands (account: optional named slot when a guild shares several accounts):
+#   /on activity:<choice> note:<text?> for:<minutes?> account:<name?>
+#   /status account:<name?>
 #   /off
-#   /updates mode:<on|off> interval:<minutes?> ping:<here|off>
-#   /clear_on (admin)
+#   /updates mode:<on|live|off> interval:<minutes?> ping:<here|off> account:<name?>
+#   /clear_on account:<name?> (admin)
+#   /stats user:<member?>
+#   /leaderboard
+#
+# Sharding: SHARD_COUNT=N runs an AutoShardedBot; SHARD_IDS=a-b limits this process
+# to a shard range (its own state file); SHARD_PROCESSES=P turns `python onbot.py`
+# into the shards.py supervisor that runs P such workers behind one health server.
 
 import os
 from aiohttp import web
 import sys
+import signal
 import json
 import time
+import hashlib
+import hmac
 import datetime
 import asyncio
 import random
 import discord
 from discord import app_commands
 from discord.ext import commands   # <-- use commands.Bot
+from state_store import open_store, atomic_write_json
+from scheduler import UpdateScheduler
+from outbound import Outbound, PRIORITY_BACKGROUND
+from metrics import Registry, LoopLagMonitor
+from shards import parse_shard_ids, shard_for, shard_suffix
+from shiftlog import ShiftLog
+from slots import Slots, normalize_account, split_key
+import debugtools
 
 # ---- optional .env
 try:
@@ -30,7 +47,58 @@ TOKEN = os.environ.get("DISCORD_TOKEN")
 if not TOKEN:
     raise SystemExit("Missing DISCORD_TOKEN env var.")
 
-STATE_FILE = os.environ.get("STATE_FILE", "onbot_state.json")
+SHARD_PROCESSES = int(os.environ.get("SHARD_PROCESSES", "1"))  # >1: supervise that many workers
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", "0"))  # 0: single unsharded gateway session
+if SHARD_PROCESSES > 1:
+    SHARD_COUNT = max(SHARD_COUNT, SHARD_PROCESSES)
+SHARD_IDS = parse_shard_ids(os.environ.get("SHARD_IDS", "")) or list(range(SHARD_COUNT))
+WORKER_ID = os.environ.get("WORKER_ID")  # set by the supervisor, for logs
+PORT = int(os.environ.get("PORT", "10000"))  # Render sets PORT
+HTTP_HOST = os.environ.get("HTTP_HOST", "0.0.0.0")
+WORKER_PORT_BASE = int(os.environ.get("WORKER_PORT_BASE", str(PORT + 1)))
+
+if __name__ == "__main__" and SHARD_PROCESSES > 1:
+    # Supervisor: spawn the workers and serve aggregated health/metrics; no bot in this process.
+    from shards import Supervisor
+    try:
+        asyncio.run(Supervisor(SHARD_COUNT, SHARD_PROCESSES, PORT, WORKER_PORT_BASE).run())
+    except KeyboardInterrupt:
+        pass
+    raise SystemExit(0)
+
+def owns_guild(guild_id: int | str) -> bool:
+    return not SHARD_COUNT or shard_for(guild_id, SHARD_COUNT) in SHARD_IDS
+
+# A worker that owns only part of the shards persists only its guilds, in its own file.
+_SHARD_SUFFIX = shard_suffix(SHARD_IDS) if SHARD_COUNT and len(SHARD_IDS) < SHARD_COUNT else ""
+
+def _sharded_path(path: str | None) -> str | None:
+    if not path or not _SHARD_SUFFIX:
+        return path
+    root, ext = os.path.splitext(path)
+    return root + _SHARD_SUFFIX + ext
+
+LEGACY_STATE_FILE = os.environ.get("STATE_FILE", "onbot_state.json")
+STATE_FILE = _sharded_path(LEGACY_STATE_FILE)
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "json")  # json | sqlite
+STATE_DB = _sharded_path(os.environ.get("STATE_DB"))  # sqlite path (default: STATE_FILE with .sqlite3)
+SYNC_CACHE_FILE = os.environ.get("SYNC_CACHE_FILE", os.path.splitext(STATE_FILE)[0] + "_sync.json")
+SYNC_CONCURRENCY = int(os.environ.get("SYNC_CONCURRENCY", "4"))  # parallel guild syncs on ready
+STATE_FLUSH_S = float(os.environ.get("STATE_FLUSH_S", "1.0"))  # write-behind coalescing window
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", "8"))  # parallel auto-update sends
+OUTBOUND_WORKERS = int(os.environ.get("OUTBOUND_WORKERS", "4"))
+OUTBOUND_RETRIES = int(os.environ.get("OUTBOUND_RETRIES", "3"))
+LOOP_LAG_INTERVAL_S = float(os.environ.get("LOOP_LAG_INTERVAL_S", "0.5"))
+SLOW_CALLBACK_MS = float(os.environ.get("SLOW_CALLBACK_MS", "100"))  # 0 disables the detector
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN")  # enables /debug/* (send as "Authorization: Bearer ...")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp")
+PROFILE_MAX_S = 120
+SHUTDOWN_GRACE_S = float(os.environ.get("SHUTDOWN_GRACE_S", "20"))  # Render kills 30s after SIGTERM
+SHIFT_LOG_FILE = _sharded_path(os.environ.get("SHIFT_LOG_FILE", os.path.splitext(LEGACY_STATE_FILE)[0] + "_shifts.log"))
+SHIFT_RETENTION_DAYS = int(os.environ.get("SHIFT_RETENTION_DAYS", "90"))  # raw records; 0 = keep forever
+SHIFT_DAILY_DAYS = int(os.environ.get("SHIFT_DAILY_DAYS", "400"))         # per-day aggregates
+LEADERBOARD_SIZE = int(os.environ.get("LEADERBOARD_SIZE", "10"))
+DEFAULT_ACCOUNT = os.environ.get("DEFAULT_ACCOUNT", "main")  # slot used when `account:` is omitted
 
 # Travian server timezone: UTC−1
 SERVER_TZ = datetime.timezone(datetime.timedelta(hours=-1), name="UTC−1")
@@ -42,29 +110,83 @@ _http_site: web.TCPSite | None = None
 async def health(_request):
     return web.Response(text="ok")
 
+async def ready(_request):
+    # liveness is /healthz; this one fails until the gateway session is actually up
+    if client.is_ready() and not client.is_closed() and not _draining:
+        return web.Response(text="ready")
+    return web.Response(text="not ready", status=503)
+
+async def metrics_handler(_request):
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+# ---- admin-only debug endpoints (disabled unless DEBUG_TOKEN is set)
+_loop_thread_id: int | None = None
+_profile_lock = asyncio.Lock()
+
+def _debug_allowed(request: web.Request) -> bool:
+    auth = request.headers.get("Authorization", "")
+    # constant-time: this runs on the public port
+    return bool(DEBUG_TOKEN) and hmac.compare_digest(auth.encode(), f"Bearer {DEBUG_TOKEN}".encode())
+
+async def debug_tasks(request):
+    if not _debug_allowed(request):
+        raise web.HTTPNotFound()
+    return web.Response(text=debugtools.dump_tasks())
+
+async def debug_profile(request):
+    """GET /debug/profile?seconds=10 — sample the loop thread, write collapsed stacks to PROFILE_DIR."""
+    if not _debug_allowed(request):
+        raise web.HTTPNotFound()
+    try:
+        seconds = min(PROFILE_MAX_S, max(1.0, float(request.query.get("seconds", "10"))))
+    except ValueError:
+        raise web.HTTPBadRequest(text="seconds must be a number")
+    if _profile_lock.locked():
+        raise web.HTTPConflict(text="a profile is already running")
+    async with _profile_lock:
+        path = os.path.join(PROFILE_DIR, f"onbot-profile-{int(time.time())}.txt")
+        loop = asyncio.get_running_loop()
+        path, samples = await loop.run_in_executor(
+            None, debugtools.sample_profile, _loop_thread_id, seconds, path)
+    top = []
+    with open(path) as f:
+        for _, line in zip(range(15), f):
+            stack, n = line.rsplit(" ", 1)
+            top.append(f"{n.strip():>6}  {stack.split(';')[-1]}")
+    return web.Response(text=f"{samples} samples over {seconds:.0f}s -> {path}\n"
+                             "top leaf frames:\n" + "\n".join(top) + "\n")
+
 async def start_http_server():
     global _http_runner, _http_site
     app = web.Application()
     app.router.add_get("/", health)
     app.router.add_get("/healthz", health)
-    port = int(os.environ.get("PORT", "10000"))  # Render sets PORT
+    app.router.add_get("/readyz", ready)
+    app.router.add_get("/metrics", metrics_handler)
+    app.router.add_get("/debug/tasks", debug_tasks)
+    app.router.add_get("/debug/profile", debug_profile)
     _http_runner = web.AppRunner(app)
     await _http_runner.setup()
-    _http_site = web.TCPSite(_http_runner, "0.0.0.0", port)
+    _http_site = web.TCPSite(_http_runner, HTTP_HOST, PORT)
     await _http_site.start()
-    print(f"[http] listening on 0.0.0.0:{port}", flush=True)
+    print(f"[http] listening on {HTTP_HOST}:{PORT}", flush=True)
 
 # ---------- helpers ----------
-def load_state() -> dict:
-    try:
-        with open(STATE_FILE, "r") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+store = open_store(STATE_BACKEND, STATE_FILE, flush_delay=STATE_FLUSH_S, db_path=STATE_DB)
+
+if store.created and STATE_FILE != LEGACY_STATE_FILE and os.path.exists(LEGACY_STATE_FILE):
+    # First start of a shard worker: take this range's guilds from the unsharded file. Later
+    # starts never re-seed, or slots cleared since would come back from the stale file.
+    _legacy = store._load_json(LEGACY_STATE_FILE)
+    store.data.update({k: cfg for k, cfg in _legacy.items()
+                       if split_key(k)[0].isdigit() and owns_guild(split_key(k)[0])})  # skips DM ("None") keys
+    store.mark_dirty(None)  # create the worker's file even when it owns none of them
+    print(f"[state] seeded {len(store.data)}/{len(_legacy)} guilds from {LEGACY_STATE_FILE}", flush=True)
 
-def save_state(state: dict) -> None:
-    with open(STATE_FILE, "w") as f:
-        json.dump(state, f)
+def save_state(key: str | None = None) -> None:
+    # Non-blocking: marks the slot dirty; the store writes it off-loop shortly after.
+    store.mark_dirty(key)
 
 def to_server_dt(epoch: int | float) -> datetime.datetime:
     return datetime.datetime.fromtimestamp(int(epoch), tz=datetime.timezone.utc).astimezone(SERVER_TZ)
@@ -83,11 +205,13 @@ def human_dur(seconds: int) -> str:
     if m: return f"{m}m"
     return f"{s}s"
 
-# persistent memory by guild:
-state = load_state()
-
-# runtime tasks (not persisted)
-update_tasks: dict[str, asyncio.Task] = {}
+# persistent memory by account slot ("<guild_id>:<account>"), indexed by guild and by sitter
+state = store.data
+slots = Slots(state, DEFAULT_ACCOUNT)
+if slots.migrate():
+    store.mark_dirty(None)
+    print(f"[state] moved single-slot guilds to account '{slots.default}'", flush=True)
+slots.reindex()
 
 # ---------- bot ----------
 ACTIVITY_CHOICES = [
@@ -100,13 +224,41 @@ ACTIVITY_CHOICES = [
     app_commands.Choice(name="other",     value="other"),
 ]
 
-class OnBot(commands.Bot):  # <-- commands.Bot
+# finished shifts (append-only) + per-user/activity/day aggregates for /stats
+shifts = ShiftLog(SHIFT_LOG_FILE, [c.value for c in ACTIVITY_CHOICES], SERVER_TZ,
+                  retention_days=SHIFT_RETENTION_DAYS, daily_days=SHIFT_DAILY_DAYS,
+                  top_n=LEADERBOARD_SIZE, flush_delay=STATE_FLUSH_S)
+
+def record_shift(key: str, cfg: dict, end: int) -> None:
+    guild_id = split_key(key)[0]
+    if not guild_id.isdigit():  # /on in a DM makes a "None:<account>" slot: no guild to log under
+        return
+    if cfg.get("user_id") and cfg.get("since"):
+        shifts.record(guild_id, cfg["user_id"], cfg.get("activity", "other"), int(cfg["since"]), end)
+
+_BotBase = commands.AutoShardedBot if SHARD_COUNT else commands.Bot
+_draining = False  # set on SIGTERM: new commands are turned away while in-flight work drains
+
+class OnTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if not _draining:
+            return True
+        try:
+            await interaction.response.send_message("🔄 Bot is restarting — try again in a minute.", ephemeral=True)
+        except Exception:
+            pass
+        return False
+
+class OnBot(_BotBase):  # <-- commands.Bot, or AutoShardedBot over SHARD_IDS
     def __init__(self):
         intents = discord.Intents.default()
+        shard_kwargs = {"shard_count": SHARD_COUNT, "shard_ids": SHARD_IDS} if SHARD_COUNT else {}
         super().__init__(
             command_prefix=commands.when_mentioned_or("!"),  # not used, just required
             intents=intents,
-            allowed_mentions=discord.AllowedMentions(everyone=True, users=True, roles=False)
+            allowed_mentions=discord.AllowedMentions(everyone=True, users=True, roles=False),
+            tree_cls=OnTree,
+            **shard_kwargs,
         )
 
     async def setup_hook(self):
@@ -118,9 +270,10 @@ class OnBot(commands.Bot):  # <-- commands.Bot
             import traceback; traceback.print_exc()
             print(f"[ask] extension FAILED: {ext_path} -> {e}", flush=True)
 
-        # Global sync (slow), but we'll also guild-sync below.
-        await self.tree.sync()
-        print("[sync] global sync requested", flush=True)
+        # Global sync (slow), but we'll also guild-sync below. Skipped if the tree is unchanged.
+        # With several workers only the one owning shard 0 does it.
+        if not SHARD_COUNT or 0 in SHARD_IDS:
+            await sync_commands(None)
 
         # Debug context
         print(f"[env] CWD={os.getcwd()}", flush=True)
@@ -128,7 +281,138 @@ class OnBot(commands.Bot):  # <-- commands.Bot
 
 client = OnBot()
 
+# all channel sends/edits (and /ask followups, via client.outbound) go through here
+outbound = Outbound(workers=OUTBOUND_WORKERS, max_retries=OUTBOUND_RETRIES)
+client.outbound = outbound
+
+def channel_route(channel) -> str:
+    return f"channel:{channel.id}"
+
+# ---------- metrics (scraped at /metrics) ----------
+registry = Registry()
+CMD_SECONDS = registry.histogram(
+    "onbot_command_seconds", "Slash command latency, interaction created to handler done", ("command",))
+CMD_ERRORS = registry.counter("onbot_command_errors_total", "Slash commands that raised", ("command",))
+STATE_WRITE_SECONDS = registry.histogram(
+    "onbot_state_write_seconds", "Background state flush duration (off-loop)",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+LOOP_LAG_SECONDS = registry.histogram(
+    "onbot_event_loop_lag_seconds", "Event loop wake-up delay",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+SLOW_CALLBACKS = registry.counter(
+    "onbot_slow_callbacks_total", f"Loop callbacks over SLOW_CALLBACK_MS ({SLOW_CALLBACK_MS:.0f}ms)", ("callback",))
+STARTUP_SECONDS = registry.gauge("onbot_startup_seconds", "Process start to first on_ready")
+store.on_write = STATE_WRITE_SECONDS.observe
+lag_monitor = LoopLagMonitor(LOOP_LAG_INTERVAL_S, LOOP_LAG_SECONDS)
+# task names carry coroutine qualnames; strip the per-task counter so the label set stays bounded
+slow_detector = debugtools.SlowCallbackDetector(
+    SLOW_CALLBACK_MS / 1000, on_slow=lambda name, _dt: SLOW_CALLBACKS.inc(name.split("(")[-1].rstrip(")")))
+
+def _finite(x: float) -> float | None:
+    return x if x == x and x not in (float("inf"), float("-inf")) else None
+
+def _ask_snapshot() -> dict:
+    cog = client.get_cog("Ask")
+    return cog.metrics_snapshot() if cog is not None and hasattr(cog, "metrics_snapshot") else {}
+
+def _per_model(field: str) -> dict:
+    return {m: v[field] for m, v in _ask_snapshot().get("models", {}).items()}
+
+def _model_latency() -> dict:
+    out = {}
+    for m, v in _ask_snapshot().get("models", {}).items():
+        for q in ("p50", "p95"):
+            if v[q] is not None:
+                out[(m, "0.5" if q == "p50" else "0.95")] = v[q]
+    return out
+
+registry.gauge("onbot_event_loop_lag_last_seconds", "Most recent loop lag sample", fn=lambda: lag_monitor.last)
+registry.gauge("onbot_gateway_latency_seconds", "Discord heartbeat latency", fn=lambda: _finite(client.latency))
+registry.gauge("onbot_ready", "1 once the Discord gateway session is ready", fn=lambda: int(client.is_ready()))
+registry.gauge("onbot_guilds", "Guilds with saved state", fn=lambda: len(slots.by_guild))
+registry.gauge("onbot_account_slots", "Account slots with saved state", fn=lambda: len(state))
+registry.gauge("onbot_shard_latency_seconds", "Heartbeat latency per gateway shard", ("shard",),
+               fn=lambda: {str(sid): _finite(lat) for sid, lat in client.latencies} if SHARD_COUNT else None)
+registry.gauge("onbot_update_schedules", "Guilds with a pending auto-update", fn=lambda: len(scheduler))
+registry.gauge("onbot_outbound_pending", "Sends waiting in the outbound queue", fn=lambda: outbound.pending())
+registry.counter("onbot_outbound_total", "Outbound queue events", ("event",), fn=lambda: dict(outbound.stats))
+registry.counter("onbot_state_writes_total", "Background state flushes", fn=lambda: store.writes)
+registry.gauge("onbot_shift_log_records", "Raw shift records kept on disk", fn=lambda: shifts.records)
+registry.counter("onbot_shifts_total", "Finished shifts recorded", fn=lambda: shifts.data.get("_seq", 0))
+registry.counter("onbot_openai_requests_total", "Upstream LLM calls", ("model",), fn=lambda: _per_model("requests"))
+registry.counter("onbot_openai_errors_total", "Failed upstream LLM calls", ("model",), fn=lambda: _per_model("errors"))
+registry.gauge("onbot_openai_latency_seconds", "Recent upstream LLM latency (rolling window)",
+               ("model", "quantile"), fn=_model_latency)
+registry.gauge("onbot_openai_breaker_open", "1 if the model's circuit breaker is not closed", ("model",),
+               fn=lambda: {m: int(st != "closed") for m, st in _per_model("state").items()})
+registry.counter("onbot_ask_cache_total", "/ask cache lookups", ("result",),
+                 fn=lambda: {k: v for k, v in _ask_snapshot().get("cache", {}).items() if k != "size"})
+registry.counter("onbot_ask_kb_total", "/ask local notes lookups", ("result",),
+                 fn=lambda: {k: v for k, v in _ask_snapshot().get("kb", {}).items() if k != "entries"})
+registry.counter("onbot_ask_tokens_total", "/ask upstream tokens billed", ("kind",),
+                 fn=lambda: {k[:-7]: v for k, v in _ask_snapshot().get("usage", {}).items() if k.endswith("_tokens")})
+registry.counter("onbot_ask_cost_usd_total", "/ask estimated upstream spend",
+                 fn=lambda: _ask_snapshot().get("usage", {}).get("cost_usd"))
+registry.gauge("onbot_ask_memory_tokens", "/ask conversation memory held, all channels",
+               fn=lambda: _ask_snapshot().get("memory", {}).get("tokens"))
+registry.gauge("onbot_ask_quota", "/ask upstream calls in flight / queued", ("state",),
+               fn=lambda: {k: v for k, v in _ask_snapshot().get("quota", {}).items() if k in ("active", "queued")})
+
+# ---------- command sync (skip when the tree is unchanged) ----------
+_boot_t = time.monotonic()
+_ready_logged = False
+
+def _load_sync_cache() -> dict:
+    try:
+        with open(SYNC_CACHE_FILE, "r") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+_sync_cache: dict[str, str] = _load_sync_cache()  # "global" / guild id -> tree hash last synced
+
+def tree_hash(guild: discord.abc.Snowflake | None) -> str:
+    payload = [c.to_dict(client.tree) for c in client.tree.get_commands(guild=guild)]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+async def save_sync_cache():
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, atomic_write_json, SYNC_CACHE_FILE, dict(_sync_cache))
+
+async def sync_commands(guild: discord.abc.Snowflake | None, force: bool = False,
+                        persist: bool = True) -> bool:
+    """Sync global (guild=None) or guild commands unless the same tree was already synced."""
+    key = str(guild.id) if guild else "global"
+    digest = tree_hash(guild)
+    if not force and _sync_cache.get(key) == digest:
+        return False
+    await client.tree.sync(guild=guild)
+    _sync_cache[key] = digest
+    if persist:
+        await save_sync_cache()
+    print(f"[sync] {key} sync OK", flush=True)
+    return True
+
+async def sync_guilds(guilds) -> int:
+    sem = asyncio.Semaphore(max(1, SYNC_CONCURRENCY))
+    async def one(g) -> bool:
+        async with sem:
+            try:
+                return await sync_commands(g, persist=False)
+            except Exception as e:
+                print(f"[sync] guild sync FAILED for {g.id}: {e}", flush=True)
+                return False
+    synced = sum(await asyncio.gather(*(one(g) for g in guilds)))
+    if synced:
+        await save_sync_cache()
+    return synced
+
 # ---------- compose + send helpers ----------
+def account_label(cfg: dict) -> str:
+    # guilds that only ever use the default slot see the same text as before
+    acc = cfg.get("account")
+    return f" `{acc}`" if acc and acc != slots.default else ""
+
 def compose_update_text(cfg: dict, now: int | None = None) -> str:
     now = now or int(time.time())
     since = int(cfg["since"])
@@ -141,77 +425,187 @@ def compose_update_text(cfg: dict, now: int | None = None) -> str:
     if end and end < now:
         line2 += " (planned end passed)"
     elapsed = human_dur(now - since)
-    return f"{user_mention} **ON** — **{cfg['activity']}**{note}\n{line2} — **{elapsed}** elapsed."
+    return f"{user_mention} **ON**{account_label(cfg)} — **{cfg['activity']}**{note}\n{line2} — **{elapsed}** elapsed."
 
-async def send_update_once(channel: discord.abc.Messageable, cfg: dict):
+async def send_update_once(channel: discord.abc.Messageable, cfg: dict,
+                           priority: int = PRIORITY_BACKGROUND):
     prefix = "@here " if cfg.get("ping_here") else ""
-    await channel.send(
-        prefix + "⏱️ Auto-update: " + compose_update_text(cfg),
-        allowed_mentions=discord.AllowedMentions(everyone=True, users=True)
+    text = prefix + "⏱️ Auto-update: " + compose_update_text(cfg)
+    await outbound.send(
+        channel_route(channel),
+        lambda: channel.send(text, allowed_mentions=discord.AllowedMentions(everyone=True, users=True)),
+        priority,
     )
 
-# ---------- update loop ----------
-async def update_loop(guild_id: str):
+# ---------- live status (edit-in-place) ----------
+# last text rendered into each slot's live message (runtime only; worst case after
+# a restart is one redundant edit)
+_live_text: dict[str, str] = {}
+
+def compose_live_text(cfg: dict, now: int | None = None) -> str:
+    return "📌 Live status: " + compose_update_text(cfg, now)
+
+async def refresh_live_status(key: str, channel, cfg: dict,
+                              priority: int = PRIORITY_BACKGROUND):
+    """Post the live status message once, then edit it only when the text changed."""
+    text = compose_live_text(cfg)
+    msg_id = cfg.get("live_message_id")
+    route = channel_route(channel)
+    if msg_id:
+        if _live_text.get(key) == text:
+            return
+        try:
+            await outbound.send(route, lambda: channel.get_partial_message(msg_id).edit(content=text), priority)
+            _live_text[key] = text
+            return
+        except discord.NotFound:
+            pass  # deleted by someone: post a fresh one below
+    msg = await outbound.send(
+        route, lambda: channel.send(text, allowed_mentions=discord.AllowedMentions(users=True)), priority
+    )
+    if msg is None:  # dropped under backlog; try again next tick
+        return
+    cfg["live_message_id"] = msg.id
+    _live_text[key] = text
+    save_state(key)
+
+async def end_live_status(key: str, cfg: dict, text: str):
+    """Leave a final line in the live message when the shift ends (best effort)."""
+    _live_text.pop(key, None)
+    msg_id = cfg.get("live_message_id")
+    channel = client.get_channel(cfg.get("channel_id")) if msg_id else None
+    if not channel:
+        return
     try:
-        while True:
-            cfg = state.get(guild_id)
-            if not cfg or not cfg.get("updates_enabled") or not cfg.get("user_id"):
-                break
-            chan_id = cfg.get("channel_id")
-            channel = client.get_channel(chan_id) if chan_id else None
-            if not channel:
-                cfg["updates_enabled"] = False
-                save_state(state)
-                break
-            try:
-                await send_update_once(channel, cfg)
-            except Exception:
-                pass
-            interval = max(5, int(cfg.get("interval_min", 60))) * 60
-            await asyncio.sleep(interval)
-    finally:
-        t = update_tasks.get(guild_id)
-        if t and t.done():
-            update_tasks.pop(guild_id, None)
-
-def start_update_task(guild_id: str):
-    t = update_tasks.get(guild_id)
-    if t and not t.done():
-        t.cancel()
-    if state.get(guild_id, {}).get("updates_enabled"):
-        update_tasks[guild_id] = client.loop.create_task(update_loop(guild_id))
-
-def stop_update_task(guild_id: str):
-    t = update_tasks.get(guild_id)
-    if t and not t.done():
-        t.cancel()
-    update_tasks.pop(guild_id, None)
+        await outbound.send(
+            channel_route(channel),
+            lambda: channel.get_partial_message(msg_id).edit(content="📌 Live status: " + text),
+        )
+    except Exception:
+        pass
+
+# ---------- update scheduler ----------
+def update_interval_s(cfg: dict) -> int:
+    return max(5, int(cfg.get("interval_min", 60))) * 60
+
+def live_tick_s(cfg: dict, now: float | None = None) -> float:
+    # The elapsed text changes every minute, so interval_min is the minimum gap between
+    # edits; land just past an elapsed-minute rollover so the edit shows a fresh value.
+    now = now or time.time()
+    since = int(cfg.get("since", now))
+    return update_interval_s(cfg) + (60 - (now - since) % 60) % 60 + 0.5
+
+async def run_update(key: str) -> float | None:
+    """Send one auto-update for a slot; returns seconds until the next one, or None to stop."""
+    cfg = state.get(key)
+    if not cfg or not cfg.get("updates_enabled") or not cfg.get("user_id"):
+        return None
+    chan_id = cfg.get("channel_id")
+    channel = client.get_channel(chan_id) if chan_id else None
+    if not channel:
+        cfg["updates_enabled"] = False
+        save_state(key)
+        return None
+    if cfg.get("updates_mode") == "live":
+        try:
+            await refresh_live_status(key, channel, cfg)
+        except Exception as e:
+            print(f"[updates] live refresh FAILED for {key}: {e}", flush=True)
+        return live_tick_s(cfg)
+    try:
+        await send_update_once(channel, cfg)
+    except Exception as e:
+        print(f"[updates] auto-update FAILED for {key}: {e}", flush=True)
+    return update_interval_s(cfg)
+
+# runtime schedule (not persisted): one task for all slots
+scheduler = UpdateScheduler(run_update, max_concurrency=UPDATE_CONCURRENCY)
+
+def start_update_task(key: str, delay: float = 0.0):
+    if state.get(key, {}).get("updates_enabled"):
+        scheduler.schedule(key, delay)
+    else:
+        scheduler.cancel(key)
+
+def stop_update_task(key: str):
+    scheduler.cancel(key)
+
+def rehydrate_updates():
+    """Re-arm auto-updates persisted in state (e.g. after a restart), at the due time
+    saved on shutdown when there is one, else one interval from now."""
+    now = time.time()
+    n = 0
+    for key, cfg in state.items():
+        due = cfg.pop("next_due", None)
+        if due is not None:
+            save_state(key)
+        if cfg.get("updates_enabled") and cfg.get("user_id") and not scheduler.is_scheduled(key):
+            delay = due - now if due is not None else update_interval_s(cfg)
+            if delay < 0:
+                delay = random.uniform(0, 5)  # came due while we were down: catch up, spread out
+            scheduler.schedule(key, delay)
+            n += 1
+    if n:
+        print(f"[sched] rehydrated {n} auto-update schedules", flush=True)
 
 # ---------- commands ----------
+def resolve_slot(interaction: discord.Interaction, account: str | None) -> str:
+    """Slot a command targets: the named account, else the one the caller is sitting,
+    else the guild's only slot, else the default account."""
+    guild_id = str(interaction.guild_id)
+    if normalize_account(account):
+        return Slots.key(guild_id, normalize_account(account))
+    mine = slots.of_user(guild_id, interaction.user.id)
+    if mine:
+        return mine
+    accounts = slots.accounts(guild_id)
+    if len(accounts) == 1:
+        return next(iter(accounts.values()))
+    return Slots.key(guild_id, slots.default)
+
+async def account_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    typed = normalize_account(current)
+    names = sorted(a for a in slots.accounts(interaction.guild_id) if typed in a)
+    return [app_commands.Choice(name=a, value=a) for a in names[:25]]
+
 @client.tree.command(description="Mark yourself ON the account and log it here")
 @app_commands.describe(activity="What are you doing?",
                        note="Optional short note",
-                       for_min="Planned duration in minutes (optional)")
+                       for_min="Planned duration in minutes (optional)",
+                       account="Which shared account (default: main)")
 @app_commands.choices(activity=ACTIVITY_CHOICES)
+@app_commands.autocomplete(account=account_autocomplete)
 async def on(interaction: discord.Interaction,
              activity: app_commands.Choice[str],
              note: str | None = None,
-             for_min: int | None = None):
+             for_min: int | None = None,
+             account: str | None = None):
     guild_id = str(interaction.guild_id)
-    current = state.get(guild_id)
+    mine = slots.of_user(guild_id, interaction.user.id)
+    if normalize_account(account):
+        key = Slots.key(guild_id, normalize_account(account))
+    else:
+        key = mine or Slots.key(guild_id, slots.default)
+    current = state.get(key)
 
-    if current and current.get("user_id") != interaction.user.id:
+    if current and current.get("user_id") not in (None, interaction.user.id):
         claimed_by = interaction.guild.get_member(current["user_id"])
         who = claimed_by.mention if claimed_by else f"<@{current['user_id']}>"
         return await interaction.response.send_message(
-            f"🔴 Already ON by {who}. Use `/status` or ask a lead to `/clear_on`.",
+            f"🔴 `{split_key(key)[1]}` already ON by {who}. Use `/status` or ask a lead to `/clear_on`.",
             ephemeral=True
         )
+    if mine and mine != key:
+        return await interaction.response.send_message(
+            f"ℹ️ You are already ON `{split_key(mine)[1]}` — `/off` first.", ephemeral=True
+        )
 
     now = int(time.time())
     until = now + int(for_min * 60) if for_min and for_min > 0 else None
+    if current and current.get("user_id") == interaction.user.id:
+        record_shift(key, current, now)  # re-/on: close the previous segment
 
-    state[guild_id] = {
+    cfg = slots.set(key, {
         "user_id": interaction.user.id,
         "activity": activity.value,
         "note": (note or ""),
@@ -221,27 +615,52 @@ async def on(interaction: discord.Interaction,
         "interval_min": current.get("interval_min", 60) if current else 60,
         "channel_id": interaction.channel_id,
         "ping_here": current.get("ping_here", False) if current else False,
-    }
-    save_state(state)
+    })
+    if current and current.get("updates_mode"):
+        cfg["updates_mode"] = current["updates_mode"]
+    if current and current.get("live_message_id") and current.get("channel_id") == interaction.channel_id:
+        cfg["live_message_id"] = current["live_message_id"]
+    save_state(key)
 
     extras = []
     if note: extras.append(note)
     if until: extras.append(f"for {for_min}m (→ {fmt_hhmm(until)} UTC−1)")
     suffix = " — " + " | ".join(extras) if extras else ""
     msg = (
-        f"🟢 {interaction.user.mention} is **ON** acc — **{activity.value}**{suffix}\n"
+        f"🟢 {interaction.user.mention} is **ON** acc{account_label(cfg)} — **{activity.value}**{suffix}\n"
         f"Server time: **{fmt_hhmm(now)}** UTC−1 start"
     )
     await interaction.response.send_message(msg, allowed_mentions=discord.AllowedMentions(users=True))
 
-    if state[guild_id]["updates_enabled"]:
-        start_update_task(guild_id)
+    if cfg["updates_enabled"] and state.get(key) is cfg:  # not /off'd while we replied
+        start_update_task(key)
+
+def status_overview(guild_id: str, viewer_id: int) -> str:
+    """One line per slot, for guilds sharing several accounts."""
+    now = int(time.time())
+    lines = []
+    for account, key in sorted(slots.accounts(guild_id).items()):
+        cfg = state[key]
+        if not cfg.get("user_id"):
+            lines.append(f"⚪ `{account}` — free")
+            continue
+        you = " (you)" if cfg["user_id"] == viewer_id else ""
+        note = f" — {cfg['note']}" if cfg.get("note") else ""
+        lines.append(f"🟢 `{account}` — <@{cfg['user_id']}>{you} — **{cfg['activity']}**{note}, "
+                     f"since **{fmt_hhmm(cfg['since'])}** UTC−1 (**{human_dur(now - int(cfg['since']))}**)")
+    return "\n".join(lines)
 
 @client.tree.command(description="Show who is ON right now")
-async def status(interaction: discord.Interaction):
+@app_commands.describe(account="Show one account in detail (default: all)")
+@app_commands.autocomplete(account=account_autocomplete)
+async def status(interaction: discord.Interaction, account: str | None = None):
     guild_id = str(interaction.guild_id)
-    current = state.get(guild_id)
-    if not current:
+    if not normalize_account(account) and len(slots.accounts(guild_id)) > 1:
+        return await interaction.response.send_message(
+            status_overview(guild_id, interaction.user.id), allowed_mentions=discord.AllowedMentions(users=True)
+        )
+    current = state.get(resolve_slot(interaction, account))
+    if not current or not current.get("user_id"):  # /updates alone leaves a cfg with no sitter
         return await interaction.response.send_message("No one is ON.", ephemeral=False)
 
     user = interaction.guild.get_member(current["user_id"])
@@ -260,12 +679,14 @@ async def status(interaction: discord.Interaction):
     if end and end < now:
         line2 += " (planned end passed)"
 
-    updates = "ON" if current.get("updates_enabled") else "OFF"
+    updates = "OFF"
+    if current.get("updates_enabled"):
+        updates = "LIVE" if current.get("updates_mode") == "live" else "ON"
     interval = int(current.get("interval_min", 60))
     ping = "HERE" if current.get("ping_here") else "OFF"
 
     await interaction.response.send_message(
-        f"🟢 {who} is **ON** — **{current['activity']}**{note}\n"
+        f"🟢 {who} is **ON**{account_label(current)} — **{current['activity']}**{note}\n"
         f"{line2} — **{human_dur(elapsed)}** elapsed.\n"
         f"Auto-updates: **{updates}** (every **{interval}m**, ping **{ping}**) → <#{current.get('channel_id', interaction.channel_id)}>",
         allowed_mentions=discord.AllowedMentions(users=True)
@@ -273,9 +694,9 @@ async def status(interaction: discord.Interaction):
 
 @client.tree.command(description="Mark yourself OFF the account and log it here")
 async def off(interaction: discord.Interaction):
-    guild_id = str(interaction.guild_id)
-    current = state.get(guild_id)
-    if not current or current.get("user_id") != interaction.user.id:
+    key = slots.of_user(interaction.guild_id, interaction.user.id)
+    current = state.get(key) if key else None
+    if not current:
         return await interaction.response.send_message("ℹ️ You are not currently ON.", ephemeral=True)
 
     since = int(current["since"])
@@ -285,50 +706,54 @@ async def off(interaction: discord.Interaction):
     show_date = to_server_dt(since).date() != to_server_dt(now).date()
     fmter = fmt_date_hhmm if show_date else fmt_hhmm
 
-    stop_update_task(guild_id)
-    state.pop(guild_id, None)
-    save_state(state)
+    stop_update_task(key)
+    slots.pop(key)
+    save_state(key)
+    record_shift(key, current, now)
 
-    await interaction.response.send_message(
-        f"⚪ {interaction.user.mention} is **OFF**.\n"
-        f"Server time: **{fmter(since)}** → **{fmter(now)}** UTC−1 — **{human_dur(duration)}**",
-        allowed_mentions=discord.AllowedMentions(users=True)
+    off_text = (
+        f"⚪ {interaction.user.mention} is **OFF**{account_label(current)}.\n"
+        f"Server time: **{fmter(since)}** → **{fmter(now)}** UTC−1 — **{human_dur(duration)}**"
     )
+    await interaction.response.send_message(off_text, allowed_mentions=discord.AllowedMentions(users=True))
+    await end_live_status(key, current, off_text)
 
 @client.tree.command(description="Toggle periodic updates in this channel")
 @app_commands.describe(
-    mode="Turn periodic updates on or off",
+    mode="on = new message each interval, live = one message edited in place, off",
     interval="Minutes between updates (default 60)",
-    ping="Ping @here on each update?"
+    ping="Ping @here on each update?",
+    account="Which shared account (default: the one you're ON)"
 )
 @app_commands.choices(mode=[app_commands.Choice(name="on", value="on"),
+                            app_commands.Choice(name="live", value="live"),
                             app_commands.Choice(name="off", value="off")])
 @app_commands.choices(ping=[app_commands.Choice(name="here", value="here"),
                             app_commands.Choice(name="off", value="off")])
+@app_commands.autocomplete(account=account_autocomplete)
 async def updates(interaction: discord.Interaction,
                   mode: app_commands.Choice[str],
                   interval: int | None = None,
-                  ping: app_commands.Choice[str] | None = None):
-    guild_id = str(interaction.guild_id)
-    cfg = state.get(guild_id) or {}
+                  ping: app_commands.Choice[str] | None = None,
+                  account: str | None = None):
+    key = resolve_slot(interaction, account)
+    cfg = state.get(key) or {}
     if interval is not None and interval > 0:
         cfg["interval_min"] = int(interval)
     if ping is not None:
         cfg["ping_here"] = (ping.value == "here")
-    cfg["updates_enabled"] = (mode.value == "on")
+    cfg["updates_enabled"] = (mode.value != "off")
+    if cfg["updates_enabled"]:
+        cfg["updates_mode"] = mode.value
+    if cfg.get("channel_id") != interaction.channel_id:
+        cfg.pop("live_message_id", None)  # live message belongs to the old channel
     cfg["channel_id"] = interaction.channel_id
-    state[guild_id] = cfg
-    save_state(state)
-
-    if cfg.get("user_id") and cfg["updates_enabled"]:
-        channel = client.get_channel(cfg["channel_id"])
-        if channel:
-            try:
-                await send_update_once(channel, cfg)
-            except Exception:
-                pass
-        start_update_task(guild_id)
+    slots.set(key, cfg)
+    save_state(key)
 
+    live = cfg["updates_enabled"] and cfg.get("updates_mode") == "live"
+    acc = account_label(cfg)
+    ping_txt = "HERE" if cfg.get("ping_here") else "OFF"
     if not cfg.get("user_id"):
         msgs = [
             "👻 No sitter on deck. The fields are quiet. Type `/on` to claim.",
@@ -336,51 +761,170 @@ async def updates(interaction: discord.Interaction,
             "🕳️ Empty throne. Take the helm with `/on`.",
             "🕰️ Silence in the granary. Who’s up? `/on` to start the shift."
         ]
-        armed = "armed" if cfg["updates_enabled"] else "off"
-        return await interaction.response.send_message(
-            f"✅ Auto-updates **{armed}** (every **{cfg.get('interval_min',60)}m**, ping "
-            f"{'HERE' if cfg.get('ping_here') else 'OFF'}) → <#{cfg['channel_id']}>\n" + random.choice(msgs)
-        )
-
-    ping_txt = "HERE" if cfg.get("ping_here") else "OFF"
-    if cfg["updates_enabled"]:
-        return await interaction.response.send_message(
-            f"✅ Auto-updates **ON** every **{cfg['interval_min']}m** in <#{cfg['channel_id']}> (ping **{ping_txt}**)."
-        )
+        armed = ("live armed" if live else "armed") if cfg["updates_enabled"] else "off"
+        text = (f"✅ Auto-updates{acc} **{armed}** (every **{cfg.get('interval_min',60)}m**, ping "
+                f"{ping_txt}) → <#{cfg['channel_id']}>\n" + random.choice(msgs))
+    elif live:
+        text = f"✅ Live status{acc} **ON** in <#{cfg['channel_id']}> — one message, edited every **{cfg.get('interval_min', 60)}m**."
+    elif cfg["updates_enabled"]:
+        text = f"✅ Auto-updates{acc} **ON** every **{cfg['interval_min']}m** in <#{cfg['channel_id']}> (ping **{ping_txt}**)."
     else:
-        stop_update_task(guild_id)
-        return await interaction.response.send_message("✅ Auto-updates **OFF**.")
+        text = f"✅ Auto-updates{acc} **OFF**."
+        stop_update_task(key)
+
+    # Ack first: the first update goes through the outbound queue, whose retries can
+    # outlast Discord's 3s window for the initial response.
+    await interaction.response.send_message(text)
+    if cfg.get("user_id") and cfg["updates_enabled"]:
+        start_update_task(key, 0)
 
 @client.tree.command(description="(Admin) Clear current ON sitter")
+@app_commands.describe(account="Which shared account (default: main)")
+@app_commands.autocomplete(account=account_autocomplete)
 @app_commands.default_permissions(manage_guild=True)
-async def clear_on(interaction: discord.Interaction):
+async def clear_on(interaction: discord.Interaction, account: str | None = None):
+    key = resolve_slot(interaction, account)
+    stop_update_task(key)
+    current = slots.pop(key)
+    save_state(key)
+    if current:
+        record_shift(key, current, int(time.time()))
+    await interaction.response.send_message(f"✅ Cleared current ON sitter{account_label(current or {})}.",
+                                            ephemeral=True)
+    if current:
+        await end_live_status(key, current, "⚪ Sitter cleared by a lead.")
+
+@client.tree.command(description="Shift history: your totals (or another member's) and the server's")
+@app_commands.describe(user="Whose stats (default: you)")
+async def stats(interaction: discord.Interaction, user: discord.Member | None = None):
     guild_id = str(interaction.guild_id)
-    stop_update_task(guild_id)
-    state.pop(guild_id, None)
-    save_state(state)
-    await interaction.response.send_message("✅ Cleared current ON sitter.", ephemeral=True)
+    target = user or interaction.user
+    g = shifts.guild_stats(guild_id, int(time.time()))
+    if not g:
+        return await interaction.response.send_message("📊 No finished shifts yet. `/on` … `/off` to start the log.")
+    mine = shifts.user_stats(guild_id, target.id)
+    if mine:
+        line1 = (f"📊 {target.mention}: **{human_dur(mine['seconds'])}** over **{mine['shifts']}** shifts "
+                 f"(longest {human_dur(mine['longest'])}, last OFF {fmt_date_hhmm(mine['last_end'])} UTC−1)")
+    else:
+        line1 = f"📊 {target.mention} has no finished shifts yet."
+    acts = ", ".join(f"{a} {human_dur(secs)}" for a, secs, _ in g["activities"][:3])
+    await interaction.response.send_message(
+        f"{line1}\n"
+        f"Server: **{human_dur(g['seconds'])}** over **{g['shifts']}** shifts by {g['users']} sitters; "
+        f"last 7 days **{human_dur(g['recent_seconds'])}** ({g['recent_shifts']} shifts)\n"
+        f"Top activities: {acts}",
+        allowed_mentions=discord.AllowedMentions.none()
+    )
+
+@client.tree.command(description="Who has sat the account the longest")
+async def leaderboard(interaction: discord.Interaction):
+    rows = shifts.leaderboard(str(interaction.guild_id))
+    if not rows:
+        return await interaction.response.send_message("🏆 No finished shifts yet.")
+    medals = ["🥇", "🥈", "🥉"]
+    lines = [f"{medals[i] if i < 3 else f'{i + 1}.'} <@{uid}> — **{human_dur(secs)}** ({n} shifts)"
+             for i, (uid, secs, n) in enumerate(rows)]
+    await interaction.response.send_message("🏆 **Leaderboard** (all time)\n" + "\n".join(lines),
+                                            allowed_mentions=discord.AllowedMentions.none())
 
 @client.tree.command(name="sync", description="Admin: sync slash commands to this server")
 @app_commands.default_permissions(manage_guild=True)
 async def sync_cmd(interaction: discord.Interaction):
-    await client.tree.sync(guild=interaction.guild)
+    await sync_commands(interaction.guild, force=True)
     await interaction.response.send_message("✅ Commands synced to this server.", ephemeral=True)
 
 @client.event
-async def on_ready():
-    # Force a per-guild sync so commands appear instantly in each server
-    for g in client.guilds:
-        try:
-            await client.tree.sync(guild=g)
-            print(f"[sync] guild sync OK: {g.name} ({g.id})", flush=True)
-        except Exception as e:
-            print(f"[sync] guild sync FAILED for {g.id}: {e}", flush=True)
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+    CMD_SECONDS.observe(max(0.0, elapsed), command.qualified_name)
 
+@client.tree.error
+async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    name = interaction.command.qualified_name if interaction.command else "unknown"
+    CMD_ERRORS.inc(name)
+    await app_commands.CommandTree.on_error(client.tree, interaction, error)  # default logging
+
+@client.event
+async def on_ready():
+    rehydrate_updates()
+
+    global _ready_logged
+    if not _ready_logged:
+        _ready_logged = True
+        STARTUP_SECONDS.set(time.monotonic() - _boot_t)
+        where = f" worker {WORKER_ID or 0}, shards {SHARD_IDS[0]}-{SHARD_IDS[-1]}" if SHARD_COUNT else ""
+        print(f"[startup] ready in {time.monotonic() - _boot_t:.2f}s ({len(client.guilds)} guilds{where})", flush=True)
+
+    # Per-guild sync so commands appear instantly in each server; on_ready fires again on
+    # reconnects, and unchanged guilds are skipped via the persisted tree hash.
+    t0 = time.monotonic()
+    synced = await sync_guilds(client.guilds)
+    print(f"[sync] {synced}/{len(client.guilds)} guilds needed a sync ({time.monotonic() - t0:.2f}s)", flush=True)
+
+
+# ---------- graceful shutdown ----------
+def persist_schedule() -> int:
+    """Save each pending update's wall-clock due time in its slot for rehydrate_updates()."""
+    loop = asyncio.get_running_loop()
+    now, n = time.time(), 0
+    for key, cfg in state.items():
+        due = scheduler.next_due(key)
+        if due is not None:
+            cfg["next_due"] = round(now + max(0.0, due - loop.time()), 1)
+            save_state(key)
+            n += 1
+    return n
+
+async def shutdown(reason: str):
+    """Stop taking work, let in-flight /ask calls finish (up to SHUTDOWN_GRACE_S), then
+    close the gateway; main()'s finally flushes state and closes everything else."""
+    global _draining
+    if _draining:
+        return
+    _draining = True
+    t0 = time.monotonic()
+    print(f"[shutdown] {reason}: draining (grace {SHUTDOWN_GRACE_S:.0f}s)", flush=True)
+    saved = persist_schedule()
+    await scheduler.close()
+    cog = client.get_cog("Ask")
+    cut = await cog.drain(SHUTDOWN_GRACE_S) if cog is not None and hasattr(cog, "drain") else 0
+    print(f"[shutdown] {saved} schedules saved, {cut} /ask calls cut off "
+          f"({time.monotonic() - t0:.1f}s)", flush=True)
+    await client.close()
 
 # ---------- run (start HTTP + Discord) ----------
 async def main():
+    global _loop_thread_id
+    store.start()                 # background state flusher
+    shifts.start()                # shift log appends + daily compaction
+    scheduler.start()             # auto-updates for all guilds
+    outbound.start()              # rate-limit-aware send queue
+    lag_monitor.start()
+    _loop_thread_id = debugtools.loop_thread_id()
+    if SLOW_CALLBACK_MS > 0:
+        slow_detector.install()
     await start_http_server()     # bind to $PORT for Render
-    await client.start(TOKEN)     # don't use client.run()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, lambda s=sig: loop.create_task(shutdown(s.name)))
+        except NotImplementedError:  # Windows: Ctrl+C still lands in the finally below
+            pass
+    try:
+        await client.start(TOKEN)     # don't use client.run()
+    finally:
+        if not client.is_closed():
+            await client.close()  # unloads the ask cog: closes its session, saves its cache
+        slow_detector.uninstall()
+        await lag_monitor.close()
+        await scheduler.close()
+        await outbound.close()
+        await shifts.close()
+        await store.close()       # flush-on-shutdown
+        if _http_runner is not None:
+            await _http_runner.cleanup()
+        print("[shutdown] done", flush=True)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,189 @@
+# outbound.py — one queue for everything the bot sends to Discord.
+#
+# Each send is a zero-arg coroutine factory tagged with a route (one bucket per
+# channel / webhook). Routes run one request at a time so per-channel order is
+# kept; across routes, lower priority numbers go first, so interactive replies
+# overtake background auto-updates. A 429 blocks only its own route for
+# Retry-After seconds; transient failures (5xx, timeouts, connection errors)
+# are retried with exponential backoff and jitter.
+#
+# Interaction *responses* (the initial ack) are not queued: Discord wants them
+# within 3 seconds and they have their own per-interaction bucket.
+
+import heapq
+import random
+import asyncio
+import itertools
+import aiohttp
+from typing import Any, Awaitable, Callable
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+def _retry_after(exc: BaseException) -> float | None:
+    """Seconds to wait if `exc` is a rate limit (discord.HTTPException 429 / RateLimited)."""
+    ra = getattr(exc, "retry_after", None)
+    if ra is not None:
+        return float(ra)
+    if getattr(exc, "status", None) == 429:
+        resp = getattr(exc, "response", None)
+        try:
+            return float(resp.headers.get("Retry-After", 1.0))
+        except Exception:
+            return 1.0
+    return None
+
+def _is_transient(exc: BaseException) -> bool:
+    status = getattr(exc, "status", None)
+    if isinstance(status, int):
+        return status >= 500
+    return isinstance(exc, (asyncio.TimeoutError, aiohttp.ClientError, OSError))
+
+class _Item:
+    __slots__ = ("route", "factory", "priority", "seq", "future", "attempt")
+
+    def __init__(self, route, factory, priority, seq, future):
+        self.route, self.factory, self.priority, self.seq = route, factory, priority, seq
+        self.future, self.attempt = future, 0
+
+class Outbound:
+    """Rate-limit-aware dispatcher. `await outbound.send(route, lambda: channel.send(...))`."""
+
+    def __init__(self, workers: int = 4, max_retries: int = 3, backoff_s: float = 1.0,
+                 max_background: int = 500):
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.max_background = max_background
+        self._routes: dict[str, list] = {}          # route -> heap of (priority, seq, item)
+        self._ready: list[tuple[int, int, str]] = []  # routes with work, by head priority
+        self._busy: set[str] = set()
+        self._blocked_until: dict[str, float] = {}
+        self._seq = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._background = 0
+        self.stats = {"sent": 0, "retried": 0, "rate_limited": 0, "delayed": 0,
+                      "dropped": 0, "failed": 0}
+
+    def pending(self) -> int:
+        return sum(len(h) for h in self._routes.values())
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for heap in self._routes.values():
+            for _, _, item in heap:
+                if not item.future.done():
+                    item.future.cancel()
+        self._routes.clear()
+
+    async def send(self, route: str, factory: Callable[[], Awaitable[Any]],
+                   priority: int = PRIORITY_INTERACTIVE) -> Any:
+        """Queue `factory()` on `route` and wait for its result.
+        Background sends are dropped (returning None) when the backlog is full."""
+        self.start()
+        background = priority >= PRIORITY_BACKGROUND
+        if background and self._background >= self.max_background:
+            self.stats["dropped"] += 1
+            return None
+        fut = asyncio.get_running_loop().create_future()
+        item = _Item(route, factory, priority, next(self._seq), fut)
+        if background:
+            self._background += 1
+        try:
+            self._push(item)
+            return await fut
+        finally:
+            if background:
+                self._background -= 1
+
+    # ---- queue plumbing
+    def _push(self, item: _Item) -> None:
+        heap = self._routes.setdefault(item.route, [])
+        heapq.heappush(heap, (item.priority, item.seq, item))
+        self._mark_ready(item.route)
+
+    def _mark_ready(self, route: str) -> None:
+        heap = self._routes.get(route)
+        if not heap:
+            self._routes.pop(route, None)
+            return
+        prio, seq, _ = heap[0]
+        heapq.heappush(self._ready, (prio, seq, route))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _block(self, route: str, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+        until = loop.time() + delay
+        if until > self._blocked_until.get(route, 0.0):
+            self._blocked_until[route] = until
+            self.stats["delayed"] += len(self._routes.get(route, ()))
+            loop.call_later(delay, self._mark_ready, route)
+
+    async def _next_item(self) -> _Item:
+        loop = asyncio.get_running_loop()
+        while True:
+            while self._ready:
+                _, _, route = heapq.heappop(self._ready)
+                heap = self._routes.get(route)
+                if not heap or route in self._busy:
+                    continue  # stale entry; re-marked when the route frees up
+                if self._blocked_until.get(route, 0.0) > loop.time():
+                    continue  # call_later re-marks it when the block expires
+                self._blocked_until.pop(route, None)
+                _, _, item = heapq.heappop(heap)
+                if item.future.done():  # caller went away
+                    self._mark_ready(route)
+                    continue
+                self._busy.add(route)
+                return item
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._next_item()
+            try:
+                await self._run(item)
+            finally:
+                self._busy.discard(item.route)
+                self._mark_ready(item.route)
+
+    async def _run(self, item: _Item) -> None:
+        try:
+            result = await item.factory()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            ra = _retry_after(e)
+            if ra is not None or _is_transient(e):
+                item.attempt += 1
+                if item.attempt <= self.max_retries:
+                    if ra is not None:
+                        self.stats["rate_limited"] += 1
+                        delay = ra
+                    else:
+                        delay = self.backoff_s * (2 ** (item.attempt - 1)) * random.uniform(0.8, 1.2)
+                    self.stats["retried"] += 1
+                    heapq.heappush(self._routes.setdefault(item.route, []),
+                                   (item.priority, item.seq, item))
+                    self._block(item.route, delay)
+                    return
+            self.stats["failed"] += 1
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+        self.stats["sent"] += 1
+        if not item.future.done():
+            item.future.set_result(result)
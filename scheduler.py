@@ -0,0 +1,116 @@
+# scheduler.py — one task drives every guild's auto-updates.
+#
+# Due times live in a min-heap of (due, seq, key). Rescheduling pushes a new
+# entry and cancelling just forgets the key; stale heap entries are skipped
+# when they surface (and compacted away if they pile up), so both are O(log n).
+# Due keys are dispatched as separate tasks, at most `max_concurrency` at once.
+
+import heapq
+import asyncio
+import itertools
+from typing import Awaitable, Callable
+
+Dispatch = Callable[[str], Awaitable[float | None]]
+
+class UpdateScheduler:
+    """`dispatch(key)` runs when `key` is due and returns seconds until the next run (None = stop)."""
+
+    def __init__(self, dispatch: Dispatch, max_concurrency: int = 8):
+        self.dispatch = dispatch
+        self._heap: list[tuple[float, int, str]] = []
+        self._due: dict[str, tuple[float, int]] = {}  # key -> live heap entry
+        self._running: set[str] = set()
+        self._seq = itertools.count()
+        self._sem = asyncio.Semaphore(max(1, max_concurrency))
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._inflight: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def is_scheduled(self, key: str) -> bool:
+        return key in self._due or key in self._running
+
+    def next_due(self, key: str) -> float | None:
+        """Loop-clock time of the next run for `key`, if scheduled."""
+        entry = self._due.get(key)
+        return entry[0] if entry else None
+
+    def schedule(self, key: str, delay: float = 0.0) -> None:
+        """(Re)schedule `key` to run `delay` seconds from now, replacing any pending run."""
+        due = asyncio.get_running_loop().time() + max(0.0, delay)
+        seq = next(self._seq)
+        self._due[key] = (due, seq)
+        heapq.heappush(self._heap, (due, seq, key))
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._due):
+            self._compact()
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def cancel(self, key: str) -> None:
+        self._due.pop(key, None)
+
+    def _compact(self) -> None:
+        self._heap = [(due, seq, key) for key, (due, seq) in self._due.items()]
+        heapq.heapify(self._heap)
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        for t in list(self._inflight):
+            t.cancel()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            # Drop stale entries (cancelled or superseded by a reschedule).
+            while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][:2]:
+                heapq.heappop(self._heap)
+
+            timeout = None
+            if self._heap:
+                timeout = self._heap[0][0] - loop.time()
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, key = heapq.heappop(self._heap)
+            del self._due[key]
+            if key in self._running:
+                # Previous run still going; it will reschedule itself when done.
+                continue
+            await self._sem.acquire()
+            self._running.add(key)
+            t = loop.create_task(self._dispatch(key))
+            self._inflight.add(t)
+            t.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, key: str) -> None:
+        nxt = None
+        try:
+            nxt = await self.dispatch(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[sched] update for {key} FAILED: {e}", flush=True)
+        finally:
+            self._running.discard(key)
+            self._sem.release()
+        if nxt is not None and key not in self._due:
+            self.schedule(key, nxt)
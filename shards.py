@@ -0,0 +1,192 @@
+# shards.py — multi-process sharded deployment for onbot.py.
+#
+# With SHARD_PROCESSES=N (N > 1), `python onbot.py` becomes a supervisor: it
+# splits SHARD_COUNT gateway shards into N contiguous ranges and runs one
+# `onbot.py` worker process per range (SHARD_IDS=a-b). Each worker is an
+# AutoShardedBot that owns only those shards, keeps its own state file, and
+# serves its health/metrics on 127.0.0.1:<WORKER_PORT_BASE + i>. The supervisor
+# owns the public $PORT: /healthz and /readyz aggregate all workers, /metrics
+# concatenates every worker's metrics with a worker="i" label. Crashed workers
+# are restarted with backoff; SIGTERM is forwarded to all of them.
+
+import os
+import sys
+import signal
+import asyncio
+import aiohttp
+from aiohttp import web
+
+def parse_shard_ids(spec: str) -> list[int]:
+    """"0-3" -> [0, 1, 2, 3]; "0,2,5" -> [0, 2, 5]."""
+    ids: list[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            a, b = part.split("-", 1)
+            ids.extend(range(int(a), int(b) + 1))
+        else:
+            ids.append(int(part))
+    return sorted(set(ids))
+
+def shard_for(guild_id: int | str, shard_count: int) -> int:
+    # Discord's routing rule: (guild_id >> 22) % shard_count
+    return (int(guild_id) >> 22) % shard_count
+
+def split_ranges(shard_count: int, processes: int) -> list[tuple[int, int]]:
+    processes = max(1, min(processes, shard_count))
+    base, extra = divmod(shard_count, processes)
+    out, start = [], 0
+    for i in range(processes):
+        n = base + (1 if i < extra else 0)
+        out.append((start, start + n - 1))
+        start += n
+    return out
+
+def shard_suffix(shard_ids: list[int]) -> str:
+    return f".shard{shard_ids[0]}-{shard_ids[-1]}" if shard_ids else ""
+
+def with_worker_label(text: str, worker: int) -> dict[str, list[str]]:
+    """Split a metrics page into families ({name: [HELP/TYPE..., samples...]}) and tag samples."""
+    families: dict[str, list[str]] = {}
+    current = None
+    for line in text.splitlines():
+        if not line:
+            continue
+        if line.startswith("#"):
+            parts = line.split(" ", 3)
+            if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                current = parts[2]
+                families.setdefault(current, [])
+                if all(not l.startswith(f"# {parts[1]} ") for l in families[current]):
+                    families[current].append(line)
+            continue
+        name_end = min((i for i in (line.find("{"), line.find(" ")) if i != -1), default=len(line))
+        name, rest = line[:name_end], line[name_end:]
+        if rest.startswith("{"):
+            tagged = f'{name}{{worker="{worker}",{rest[1:]}'
+        else:
+            tagged = f'{name}{{worker="{worker}"}}{rest}'
+        families.setdefault(current or name, []).append(tagged)
+    return families
+
+def merge_metrics(pages: list[tuple[int, str]]) -> str:
+    merged: dict[str, list[str]] = {}
+    for worker, text in pages:
+        for fam, lines in with_worker_label(text, worker).items():
+            have = merged.setdefault(fam, [])
+            for l in lines:
+                if l.startswith("#"):
+                    if l not in have:
+                        have.insert(sum(1 for x in have if x.startswith("#")), l)
+                else:
+                    have.append(l)
+    return "\n".join(l for lines in merged.values() for l in lines) + "\n"
+
+class Supervisor:
+    def __init__(self, shard_count: int, processes: int, port: int, worker_port_base: int):
+        self.shard_count = shard_count
+        self.ranges = split_ranges(shard_count, processes)
+        self.port = port
+        self.worker_ports = [worker_port_base + i for i in range(len(self.ranges))]
+        self.procs: list[asyncio.subprocess.Process | None] = [None] * len(self.ranges)
+        self.restarts = [0] * len(self.ranges)
+        self.stopping = False
+        self.session: aiohttp.ClientSession | None = None
+
+    def _worker_env(self, i: int) -> dict:
+        a, b = self.ranges[i]
+        env = dict(os.environ)
+        env.update({
+            "SHARD_PROCESSES": "1",  # workers never supervise
+            "SHARD_COUNT": str(self.shard_count),
+            "SHARD_IDS": f"{a}-{b}",
+            "WORKER_ID": str(i),
+            "PORT": str(self.worker_ports[i]),
+            "HTTP_HOST": "127.0.0.1",
+        })
+        return env
+
+    async def _run_worker(self, i: int) -> None:
+        backoff = 1.0
+        script = os.path.abspath(sys.argv[0])
+        while not self.stopping:
+            a, b = self.ranges[i]
+            print(f"[shards] starting worker {i} (shards {a}-{b}) on :{self.worker_ports[i]}", flush=True)
+            proc = await asyncio.create_subprocess_exec(sys.executable, script, env=self._worker_env(i))
+            self.procs[i] = proc
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            code = await proc.wait()
+            if self.stopping:
+                return
+            print(f"[shards] worker {i} exited with {code}; restarting in {backoff:.0f}s", flush=True)
+            self.restarts[i] += 1
+            await asyncio.sleep(backoff)
+            backoff = 1.0 if loop.time() - started > 60 else min(60.0, backoff * 2)
+
+    async def _fetch(self, i: int, path: str) -> tuple[int, str]:
+        try:
+            async with self.session.get(f"http://127.0.0.1:{self.worker_ports[i]}{path}") as r:
+                return r.status, await r.text()
+        except Exception as e:
+            return 599, str(e)
+
+    async def _gather(self, path: str) -> list[tuple[int, str]]:
+        return await asyncio.gather(*(self._fetch(i, path) for i in range(len(self.ranges))))
+
+    async def healthz(self, _request):
+        alive = [p is not None and p.returncode is None for p in self.procs]
+        return web.Response(text="ok" if all(alive) else f"workers alive: {alive}", status=200 if all(alive) else 503)
+
+    async def readyz(self, _request):
+        res = await self._gather("/readyz")
+        ok = all(status == 200 for status, _ in res)
+        body = "\n".join(f"worker {i}: {status} {text.strip()}" for i, (status, text) in enumerate(res))
+        return web.Response(text=body + "\n", status=200 if ok else 503)
+
+    async def metrics(self, _request):
+        res = await self._gather("/metrics")
+        pages = [(i, text) for i, (status, text) in enumerate(res) if status == 200]
+        extra = (
+            "# HELP onbot_worker_up 1 if the worker answered the scrape\n# TYPE onbot_worker_up gauge\n"
+            + "".join(f'onbot_worker_up{{worker="{i}"}} {int(st == 200)}\n' for i, (st, _) in enumerate(res))
+            + "# HELP onbot_worker_restarts_total Worker process restarts\n# TYPE onbot_worker_restarts_total counter\n"
+            + "".join(f'onbot_worker_restarts_total{{worker="{i}"}} {n}\n' for i, n in enumerate(self.restarts))
+        )
+        return web.Response(text=merge_metrics(pages) + extra, content_type="text/plain", charset="utf-8")
+
+    def _stop(self) -> None:
+        self.stopping = True
+        for p in self.procs:
+            if p is not None and p.returncode is None:
+                p.send_signal(signal.SIGTERM)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self._stop)
+            except NotImplementedError:
+                pass
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5))
+        app = web.Application()
+        app.router.add_get("/", self.healthz)
+        app.router.add_get("/healthz", self.healthz)
+        app.router.add_get("/readyz", self.readyz)
+        app.router.add_get("/metrics", self.metrics)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0", self.port).start()
+        print(f"[shards] supervisor on 0.0.0.0:{self.port}: {self.shard_count} shards over "
+              f"{len(self.ranges)} workers {self.ranges}", flush=True)
+        try:
+            await asyncio.gather(*(self._run_worker(i) for i in range(len(self.ranges))))
+        finally:
+            self._stop()
+            for p in self.procs:
+                if p is not None and p.returncode is None:
+                    await p.wait()
+            await self.session.close()
+            await runner.cleanup()
@@ -0,0 +1,276 @@
+# shiftlog.py — append-only history of finished shifts + incrementally kept stats.
+#
+# Raw log: a small header (magic, base seq) followed by fixed 25-byte records
+# (guild, user, start, end, activity code). Appends are buffered and written off
+# the loop; old records are dropped by compaction (SHIFT_RETENTION_DAYS), which
+# rewrites the file atomically and bumps the base seq.
+#
+# Aggregates (per guild: totals, per user, per activity, per day, top-N) are
+# updated in O(1) as each shift is recorded and persisted through a StateStore,
+# so /stats and /leaderboard never scan the log. They remember the seq of the last
+# record they include; on startup any log tail past it (crash between the log
+# append and the aggregate write) is replayed.
+
+import os
+import time
+import struct
+import asyncio
+import datetime
+import tempfile
+from state_store import StateStore
+
+_MAGIC = b"SHF1"
+_HEADER = struct.Struct("<4sQ")      # magic, seq of the first record in the file
+_RECORD = struct.Struct("<QQIIB")    # guild_id, user_id, start, end, activity code
+DAY = 86400
+
+def _read_log(path: str) -> tuple[int, bytes]:
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return 0, b""
+    if len(raw) < _HEADER.size or raw[:4] != _MAGIC:
+        raise ValueError(f"{path} is not a shift log")
+    _, base = _HEADER.unpack_from(raw)
+    body = raw[_HEADER.size:]
+    return base, body[:len(body) - len(body) % _RECORD.size]  # drop a torn last record
+
+def _append_log(path: str, data: bytes) -> None:
+    new = not os.path.exists(path)
+    with open(path, "ab") as f:
+        if new:
+            f.write(_HEADER.pack(_MAGIC, 0))
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _rewrite_log(path: str, base: int, body: bytes) -> None:
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".log", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, base))
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+class _AggregateStore(StateStore):
+    # Aggregates are two levels deep; counters are replaced, never mutated in place,
+    # so copying the containers is enough for a consistent snapshot.
+    def _snapshot(self, dirty):
+        return {k: {f: dict(v) if isinstance(v, dict) else v for f, v in g.items()} if isinstance(g, dict) else g
+                for k, g in self.data.items()}
+
+class ShiftLog:
+    """`record()` a finished shift; read stats with `user_stats` / `guild_stats` / `leaderboard`."""
+
+    def __init__(self, path: str, activities: list[str], tz: datetime.tzinfo,
+                 retention_days: int = 90, daily_days: int = 400, top_n: int = 10,
+                 flush_delay: float = 1.0, compact_every_s: float = DAY):
+        self.path = path
+        self.activities = list(activities)  # code = index; only ever append new names
+        self.tz = tz
+        self.retention_days = retention_days
+        self.daily_days = daily_days
+        self.top_n = top_n
+        self.flush_delay = flush_delay
+        self.compact_every_s = compact_every_s
+        self.agg = _AggregateStore(os.path.splitext(path)[0] + "_stats.json", flush_delay)
+        self.data: dict = self.agg.data  # guild id -> aggregates, plus "_seq"
+        self._pending = bytearray()
+        self._lock: asyncio.Lock | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._compact_task: asyncio.Task | None = None
+        self.records = 0   # raw records currently in the file (after flush)
+        self._replay()
+
+    # ---- recording
+    def _code(self, activity: str) -> int:
+        try:
+            return self.activities.index(activity)
+        except ValueError:
+            return self.activities.index("other") if "other" in self.activities else 0
+
+    def record(self, guild_id: int | str, user_id: int, activity: str, start: int, end: int) -> None:
+        if end <= start:
+            return
+        code = self._code(activity)
+        self._pending += _RECORD.pack(int(guild_id), int(user_id), int(start), int(end), code)
+        self._apply(int(guild_id), int(user_id), code, int(start), int(end))
+        self.data["_seq"] = self.data.get("_seq", 0) + 1
+        self.agg.mark_dirty(None)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _day(self, ts: int) -> str:
+        return datetime.datetime.fromtimestamp(ts, tz=self.tz).date().isoformat()
+
+    def _apply(self, guild_id: int, user_id: int, code: int, start: int, end: int) -> None:
+        g = self.data.get(str(guild_id))
+        if g is None:
+            g = self.data[str(guild_id)] = {"total": [0, 0], "users": {}, "acts": {}, "days": {}, "top": []}
+        dur = end - start
+        g["total"] = [g["total"][0] + dur, g["total"][1] + 1]
+
+        uid = str(user_id)
+        secs, shifts, longest, _ = g["users"].get(uid, (0, 0, 0, 0))
+        g["users"][uid] = [secs + dur, shifts + 1, max(longest, dur), end]
+
+        act = self.activities[code] if code < len(self.activities) else "other"
+        a_secs, a_shifts = g["acts"].get(act, (0, 0))
+        g["acts"][act] = [a_secs + dur, a_shifts + 1]
+
+        # split across server-time midnights so per-day totals are exact
+        t = start
+        while t < end:
+            day = datetime.datetime.fromtimestamp(t, tz=self.tz).date()
+            nxt = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time(), self.tz)
+            seg_end = min(end, int(nxt.timestamp()))
+            d_secs, d_shifts = g["days"].get(day.isoformat(), (0, 0))
+            g["days"][day.isoformat()] = [d_secs + seg_end - t, d_shifts + (t == start)]
+            t = seg_end
+
+        # top-N: all-time totals only grow, so the user can only move up
+        total = secs + dur
+        top = [e for e in g["top"] if e[0] != uid]
+        if len(top) < self.top_n or total > top[-1][1]:
+            top.append([uid, total])
+            top.sort(key=lambda e: -e[1])
+            del top[self.top_n:]
+        g["top"] = top
+
+    def _replay(self) -> None:
+        base, body = _read_log(self.path)
+        n = len(body) // _RECORD.size
+        self.records = n
+        done = self.data.get("_seq", 0)
+        start = max(0, done - base)
+        if start >= n:
+            return
+        for i in range(start, n):
+            gid, uid, s, e, code = _RECORD.unpack_from(body, i * _RECORD.size)
+            self._apply(gid, uid, code, s, e)
+        self.data["_seq"] = base + n
+        self.agg.mark_dirty(None)
+        print(f"[shifts] replayed {n - start} records into the aggregates", flush=True)
+
+    # ---- queries (all O(1) in the number of logged shifts)
+    def user_stats(self, guild_id: int | str, user_id: int) -> dict | None:
+        row = self.data.get(str(guild_id), {}).get("users", {}).get(str(user_id))
+        if row is None:
+            return None
+        secs, shifts, longest, last_end = row
+        return {"seconds": secs, "shifts": shifts, "longest": longest, "last_end": last_end}
+
+    def guild_stats(self, guild_id: int | str, now: int, days: int = 7) -> dict | None:
+        g = self.data.get(str(guild_id))
+        if g is None:
+            return None
+        recent = [g["days"].get(self._day(now - i * DAY), (0, 0)) for i in range(days)]
+        acts = sorted(g["acts"].items(), key=lambda kv: -kv[1][0])
+        return {
+            "seconds": g["total"][0], "shifts": g["total"][1], "users": len(g["users"]),
+            "recent_seconds": sum(r[0] for r in recent), "recent_shifts": sum(r[1] for r in recent),
+            "activities": [(a, v[0], v[1]) for a, v in acts],
+        }
+
+    def leaderboard(self, guild_id: int | str) -> list[tuple[int, int, int]]:
+        g = self.data.get(str(guild_id))
+        if g is None:
+            return []
+        return [(int(uid), secs, g["users"][uid][1]) for uid, secs in g["top"]]
+
+    # ---- background flush + compaction
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        if self._pending or self.agg._dirty:
+            self._wakeup.set()
+        loop = asyncio.get_running_loop()
+        self._task = loop.create_task(self._run())
+        self._compact_task = loop.create_task(self._compact_loop())
+
+    async def flush(self) -> None:
+        """Append buffered records, then persist the aggregates (in that order)."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._pending:
+                data, self._pending = bytes(self._pending), bytearray()
+                loop = asyncio.get_running_loop()
+                try:
+                    await asyncio.shield(loop.run_in_executor(None, _append_log, self.path, data))
+                except Exception as e:
+                    self._pending[:0] = data  # retry next round
+                    print(f"[shifts] log append FAILED: {e}", flush=True)
+                    return
+                self.records += len(data) // _RECORD.size
+            await self.agg.flush()
+
+    async def compact(self, now: int) -> int:
+        """Drop raw records older than the retention window and per-day buckets past
+        `daily_days`. Returns the number of records removed."""
+        for g in self.data.values():
+            if isinstance(g, dict) and "days" in g:
+                cutoff = self._day(now - self.daily_days * DAY)
+                old = [d for d in g["days"] if d < cutoff]
+                if old:
+                    g["days"] = {d: v for d, v in g["days"].items() if d >= cutoff}
+                    self.agg.mark_dirty(None)
+        if self.retention_days <= 0:
+            return 0
+        await self.flush()
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            cutoff = now - self.retention_days * DAY
+            base, body = await loop.run_in_executor(None, _read_log, self.path)
+            keep, dropped = bytearray(), 0
+            # records are appended in end order, so the expired ones form a prefix
+            for off in range(0, len(body), _RECORD.size):
+                if _RECORD.unpack_from(body, off)[3] >= cutoff:
+                    keep = body[off:]
+                    break
+                dropped += 1
+            if dropped:
+                await asyncio.shield(loop.run_in_executor(None, _rewrite_log, self.path, base + dropped, bytes(keep)))
+                self.records = len(keep) // _RECORD.size
+                print(f"[shifts] compacted: dropped {dropped} records older than {self.retention_days}d", flush=True)
+        return dropped
+
+    async def close(self) -> None:
+        for t in (self._task, self._compact_task):
+            if t and not t.done():
+                t.cancel()
+                try:
+                    await t
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._compact_task = None
+        await self.flush()
+        await self.agg.close()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await asyncio.sleep(self.flush_delay)
+            await self.flush()
+
+    async def _compact_loop(self) -> None:
+        while True:
+            try:
+                await self.compact(int(time.time()))
+            except Exception as e:
+                print(f"[shifts] compaction FAILED: {e}", flush=True)
+            await asyncio.sleep(self.compact_every_s)
@@ -0,0 +1,85 @@
+# slots.py — several shared accounts per guild.
+#
+# Each account slot is one entry in the persisted state dict, keyed
+# "<guild_id>:<account>", so the store, scheduler and live-status maps keep working
+# per slot without knowing about accounts. Two in-memory indexes make the common
+# lookups O(1) however many slots a guild has:
+#   by_guild[guild_id] -> {account: key}         (/status overview, autocomplete)
+#   by_user[(guild_id, user_id)] -> key          ("what am I on?", /off)
+# Every change to a slot's existence or sitter goes through set()/pop().
+
+def normalize_account(name: str | None) -> str:
+    name = " ".join((name or "").split()).lower()
+    return name[:32]
+
+def split_key(key: str) -> tuple[str, str]:
+    guild_id, _, account = key.partition(":")
+    return guild_id, account
+
+class Slots:
+    def __init__(self, data: dict, default_account: str = "main"):
+        self.data = data
+        self.default = normalize_account(default_account) or "main"
+        self.by_guild: dict[str, dict[str, str]] = {}
+        self.by_user: dict[tuple[str, int], str] = {}
+
+    @staticmethod
+    def key(guild_id: int | str, account: str) -> str:
+        return f"{guild_id}:{account}"
+
+    def migrate(self) -> int:
+        """Move legacy single-slot entries (bare guild id keys) to the default account."""
+        legacy = [k for k in self.data if ":" not in k]
+        for gid in legacy:
+            cfg = self.data.pop(gid)
+            cfg["account"] = self.default
+            self.data.setdefault(self.key(gid, self.default), cfg)
+        return len(legacy)
+
+    def reindex(self) -> None:
+        self.by_guild.clear()
+        self.by_user.clear()
+        for key, cfg in self.data.items():
+            self._index(key, cfg)
+
+    def _index(self, key: str, cfg: dict) -> None:
+        gid, account = split_key(key)
+        self.by_guild.setdefault(gid, {})[account] = key
+        if cfg.get("user_id"):
+            self.by_user[(gid, cfg["user_id"])] = key
+
+    def _unindex(self, key: str) -> None:
+        gid, account = split_key(key)
+        old = self.data.get(key)
+        if old and old.get("user_id") and self.by_user.get((gid, old["user_id"])) == key:
+            del self.by_user[(gid, old["user_id"])]
+        accounts = self.by_guild.get(gid)
+        if accounts is not None:
+            accounts.pop(account, None)
+            if not accounts:
+                del self.by_guild[gid]
+
+    # ---- lookups
+    def get(self, guild_id: int | str, account: str) -> dict | None:
+        return self.data.get(self.key(guild_id, account))
+
+    def accounts(self, guild_id: int | str) -> dict[str, str]:
+        return self.by_guild.get(str(guild_id), {})
+
+    def of_user(self, guild_id: int | str, user_id: int) -> str | None:
+        """Key of the slot `user_id` is sitting in this guild, if any."""
+        return self.by_user.get((str(guild_id), user_id))
+
+    # ---- mutations
+    def set(self, key: str, cfg: dict) -> dict:
+        self._unindex(key)
+        cfg["account"] = split_key(key)[1]
+        self.data[key] = cfg
+        self._index(key, cfg)
+        return cfg
+
+    def pop(self, key: str) -> dict | None:
+        if key not in self.data:
+            return None
+        self._unindex(key)
+        return self.data.pop(key)
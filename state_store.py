@@ -0,0 +1,207 @@
+# state_store.py — write-behind persistence for the per-guild state dict.
+#
+# Command handlers mutate `store.data` in place and call `store.mark_dirty(guild_id)`.
+# Nothing touches the disk on the event loop: a background task coalesces dirty
+# guilds for `flush_delay` seconds, snapshots them, and hands the write to the
+# default executor. Files are replaced atomically (temp file + os.replace), so a
+# crash mid-write leaves the previous version intact.
+#
+# Backends: StateStore rewrites one JSON file; SqliteStateStore keeps one row
+# per guild and only upserts/deletes the guilds that changed (WAL mode).
+
+import os
+import json
+import asyncio
+import sqlite3
+import tempfile
+from typing import Callable
+
+def atomic_write_json(path: str, obj) -> None:
+    """Write `obj` as JSON to `path` via a temp file in the same dir + rename."""
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=folder)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(obj, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+class StateStore:
+    """JSON-file backend. `data` is the live dict; writes happen off-loop."""
+
+    def __init__(self, path: str, flush_delay: float = 1.0):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.created = not os.path.exists(path)  # first start on this file
+        self.data: dict = self._load()
+        self._dirty: set[str] = set()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._write_lock: asyncio.Lock | None = None
+        self._inflight: asyncio.Future | None = None
+        self.writes = 0
+        self.last_write_s = 0.0
+        self.on_write: Callable[[float], None] | None = None  # e.g. a metrics histogram
+
+    # ---- backend hooks
+    def _load(self) -> dict:
+        return self._load_json(self.path)
+
+    @staticmethod
+    def _load_json(path: str) -> dict:
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _snapshot(self, dirty: set[str]):
+        # Runs on the loop thread: a shallow copy per guild is enough, cfg values are flat.
+        return {k: dict(v) if isinstance(v, dict) else v for k, v in self.data.items()}
+
+    def _write(self, snapshot) -> None:
+        atomic_write_json(self.path, snapshot)
+
+    # ---- public API
+    def mark_dirty(self, guild_id: str | None = None) -> None:
+        """Schedule `guild_id` (or everything, if None) for the next background flush."""
+        self._dirty.add(guild_id if guild_id is not None else "*")
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        """Start the background flusher on the running loop (idempotent)."""
+        if self._task and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        if self._dirty:
+            self._wakeup.set()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def flush(self) -> None:
+        """Write all pending changes now (off the loop thread)."""
+        if not self._dirty:
+            return
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        async with self._write_lock:
+            dirty, self._dirty = self._dirty, set()
+            if not dirty:
+                return
+            snapshot = self._snapshot(dirty)
+            loop = asyncio.get_running_loop()
+            t0 = loop.time()
+            self._inflight = loop.run_in_executor(None, self._write, snapshot)
+            try:
+                # shield: a cancelled flusher must not orphan a half-finished write
+                await asyncio.shield(self._inflight)
+            except Exception as e:
+                self._dirty |= dirty  # retry on the next round
+                print(f"[state] write FAILED: {e}", flush=True)
+                return
+            self.writes += 1
+            self.last_write_s = loop.time() - t0
+            if self.on_write is not None:
+                self.on_write(self.last_write_s)
+
+    async def close(self) -> None:
+        """Flush-on-shutdown hook: stop the flusher and persist whatever is pending."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        if self._inflight is not None and not self._inflight.done():
+            try:
+                await self._inflight
+            except Exception:
+                pass
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Coalesce bursts of commands into a single write.
+            await asyncio.sleep(self.flush_delay)
+            await self.flush()
+
+class SqliteStateStore(StateStore):
+    """One row per guild; each flush touches only dirty guilds, in one transaction."""
+
+    def __init__(self, path: str, flush_delay: float = 1.0, migrate_from: str | None = None):
+        self.migrate_from = migrate_from
+        created = not os.path.exists(path)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS guild_state (guild_id TEXT PRIMARY KEY, cfg TEXT NOT NULL)"
+        )
+        super().__init__(path, flush_delay)
+        self.created = created
+
+    def _load(self) -> dict:
+        rows = self._db.execute("SELECT guild_id, cfg FROM guild_state").fetchall()
+        # user_version 1 = legacy import done; an empty table after that just means no one is ON
+        migrated = self._db.execute("PRAGMA user_version").fetchone()[0] >= 1
+        data = {gid: json.loads(cfg) for gid, cfg in rows}
+        if not rows and not migrated and self.migrate_from and os.path.exists(self.migrate_from):
+            # First start on SQLite: import the legacy JSON file once.
+            data = self._load_json(self.migrate_from)
+            if data:
+                self._write((True, {k: json.dumps(v) for k, v in data.items()}))
+                print(f"[state] migrated {len(data)} guilds from {self.migrate_from}", flush=True)
+        if not migrated:
+            self._db.execute("PRAGMA user_version = 1")
+        return data
+
+    def _snapshot(self, dirty: set[str]):
+        if "*" in dirty:
+            return True, {k: json.dumps(v) for k, v in self.data.items()}
+        return False, {g: (json.dumps(self.data[g]) if g in self.data else None) for g in dirty}
+
+    def _write(self, snapshot) -> None:
+        replace_all, rows = snapshot
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if replace_all:
+                db.execute("DELETE FROM guild_state")
+            db.executemany(
+                "INSERT INTO guild_state (guild_id, cfg) VALUES (?, ?) "
+                "ON CONFLICT(guild_id) DO UPDATE SET cfg = excluded.cfg",
+                [(g, cfg) for g, cfg in rows.items() if cfg is not None],
+            )
+            db.executemany(
+                "DELETE FROM guild_state WHERE guild_id = ?",
+                [(g,) for g, cfg in rows.items() if cfg is None],
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    async def close(self) -> None:
+        await super().close()
+        self._db.close()
+
+def open_store(backend: str, path: str, flush_delay: float = 1.0, db_path: str | None = None) -> StateStore:
+    """Pick a backend by name ("json" or "sqlite"). SQLite migrates `path` on first start."""
+    backend = (backend or "json").lower()
+    if backend == "json":
+        return StateStore(path, flush_delay)
+    if backend == "sqlite":
+        db_path = db_path or os.path.splitext(path)[0] + ".sqlite3"
+        return SqliteStateStore(db_path, flush_delay, migrate_from=path)
+    raise ValueError(f"Unknown STATE_BACKEND: {backend!r} (use 'json' or 'sqlite')")